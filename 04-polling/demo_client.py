@@ -1,8 +1,11 @@
 import asyncio
 import aiohttp
+import json
 import time
+import uuid
 
 BASE_URL = "http://localhost:8001"
+HEARTBEAT_URL = "http://localhost:9000"  # sharding service, used by the benchmark
 
 async def test_short_poll(user_id: str):
     """Client pings every second"""
@@ -13,18 +16,102 @@ async def test_short_poll(user_id: str):
                 print(f"Short poll #{i+1}: {result['status']}")
             await asyncio.sleep(1)
 
-async def test_long_poll(user_id: str):
-    """Server waits internally"""
+async def test_long_poll(user_id: str, rounds: int = 3):
+    """Server waits internally until the status differs from our version"""
+    version = None
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=None)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        for i in range(rounds):
+            print("Long poll: waiting for response...")
+            params = {"since": version} if version else {}
+            async with session.get(f"{BASE_URL}/long-poll/{user_id}", params=params) as response:
+                if response.status == 304:
+                    print(f"Long poll #{i+1}: no change, still {version}")
+                    continue
+                result = await response.json()
+                version = result["version"]
+                print(f"Long poll #{i+1}: {result['status']}")
+
+async def test_batch_poll(user_ids: list):
+    """One request covers every user on the dashboard"""
     async with aiohttp.ClientSession() as session:
-        print("Long poll: waiting for response...")
-        async with session.get(f"{BASE_URL}/long-poll/{user_id}") as response:
-            result = await response.json()
-            print(f"Long poll result: {result['status']}")
+        for i in range(5):
+            async with session.post(f"{BASE_URL}/short-poll/batch", json={"user_ids": user_ids}) as response:
+                result = await response.json()
+                active = [user_id for user_id, heartbeat in result["users"].items() if heartbeat is not None]
+                print(f"Batch poll #{i+1}: {len(active)}/{len(user_ids)} active")
+            await asyncio.sleep(1)
+
+async def test_stream(user_ids: list, duration: float = 40):
+    """Subscribe once, server pushes every active/inactive transition"""
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=None)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        print(f"Stream: subscribed to {len(user_ids)} users for {duration:.0f}s...")
+        async with session.get(f"{BASE_URL}/stream", params={"user_ids": ",".join(user_ids)}) as response:
+            deadline = time.time() + duration
+            while time.time() < deadline:
+                try:
+                    line = await asyncio.wait_for(response.content.readline(), timeout=deadline - time.time())
+                except asyncio.TimeoutError:
+                    break
+                if line.startswith(b"data: "):
+                    event = json.loads(line[len(b"data: "):])
+                    print(f"Stream event: user {event['user_id']} is {event['status']}")
+
+async def watch_until_active(mode: str, session: aiohttp.ClientSession, user_id: str, counter: dict) -> float:
+    """Block until `mode` reports the user active, return the time it noticed"""
+    if mode == "short-poll":
+        while True:
+            counter["requests"] += 1
+            async with session.get(f"{BASE_URL}/short-poll/{user_id}") as response:
+                if (await response.json())["status"] == "active":
+                    return time.time()
+            await asyncio.sleep(1)
+    elif mode == "long-poll":
+        while True:
+            counter["requests"] += 1
+            async with session.get(f"{BASE_URL}/long-poll/{user_id}", params={"since": "inactive"}) as response:
+                if response.status == 200 and (await response.json())["status"] == "active":
+                    return time.time()
+    else:
+        counter["requests"] += 1
+        async with session.get(f"{BASE_URL}/stream", params={"user_ids": user_id}) as response:
+            async for line in response.content:
+                if line.startswith(b"data: ") and json.loads(line[len(b"data: "):])["status"] == "active":
+                    return time.time()
+
+async def benchmark(idle_seconds: float = 5):
+    """
+    Compare the three modes for one user that comes online after `idle_seconds`.
+    Needs the sharding service on :9000 to record the heartbeat.
+    """
+    print("\nBenchmark: requests/sec and notification latency")
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=None)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        for mode in ("short-poll", "long-poll", "stream"):
+            user_id = f"bench-{uuid.uuid4().hex[:8]}"
+            counter = {"requests": 0}
+            started = time.time()
+            watcher = asyncio.create_task(watch_until_active(mode, session, user_id, counter))
+
+            await asyncio.sleep(idle_seconds)
+            sent_at = time.time()
+            async with session.post(f"{HEARTBEAT_URL}/heartbeat", json={"user_id": user_id}) as response:
+                response.raise_for_status()
+
+            noticed_at = await watcher
+            elapsed = noticed_at - started
+            print(f"{mode:>10}: {counter['requests']:3d} requests "
+                  f"({counter['requests'] / elapsed:.2f} req/s), "
+                  f"latency {(noticed_at - sent_at) * 1000:.0f}ms")
 
 async def main():
     print("Testing Short Poll vs Long Poll")
     await test_short_poll("1")
-    await test_long_poll("1")
+    await test_long_poll("1", rounds=1)
+    await test_batch_poll([str(i) for i in range(1, 501)])
+    await test_stream(["1", "2"])
+    await benchmark()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,288 @@
+"""
+Load generator: short poll vs long poll vs stream at scale
+==========================================================
+Simulates N users going online and offline. Each user has a watcher client
+that follows its presence with one of the polling strategies. Heartbeats are
+written straight into the shard files (what the sharding service would do).
+
+Reports per strategy:
+- server requests/sec and database queries/sec (from GET /stats)
+- client-observed staleness: how long after the real change a client noticed
+- request latency percentiles
+
+Usage:
+    python load_test.py --users 200 --duration 60
+    python load_test.py --base-url http://localhost:8001   # against a running server
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Tuple
+
+import aiohttp
+import uvicorn
+
+import polling_simple
+
+STRATEGIES = ["short-poll", "long-poll", "stream"]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def init_shards():
+    for db_name in polling_simple.DB_NAMES:
+        conn = sqlite3.connect(db_name)
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS heartbeats (
+            user_id TEXT PRIMARY KEY,
+            last_heartbeat INTEGER
+        )
+        ''')
+        conn.commit()
+        conn.close()
+
+
+def start_in_process_server(port: int) -> uvicorn.Server:
+    """Run polling_simple.app in a background thread of this process"""
+    server = uvicorn.Server(uvicorn.Config(polling_simple.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+class HeartbeatWriter:
+    """Collects heartbeats from all simulated users and writes them per shard in one transaction"""
+
+    def __init__(self, flush_interval: float = 0.1):
+        self.flush_interval = flush_interval
+        self.pending: Dict[str, None] = {}
+
+    def beat(self, user_id: str):
+        self.pending[user_id] = None
+
+    def _write(self, user_ids: List[str]) -> int:
+        now = int(time.time())
+        by_shard: Dict[str, List[Tuple[str, int]]] = {}
+        for user_id in user_ids:
+            by_shard.setdefault(polling_simple.get_shard(user_id), []).append((user_id, now))
+        for db_name, rows in by_shard.items():
+            conn = sqlite3.connect(db_name, timeout=10)
+            conn.executemany('REPLACE INTO heartbeats (user_id, last_heartbeat) VALUES (?, ?)', rows)
+            conn.commit()
+            conn.close()
+        return now
+
+    async def run(self, stop: asyncio.Event, on_written):
+        while not stop.is_set():
+            await asyncio.sleep(self.flush_interval)
+            if self.pending:
+                user_ids, self.pending = list(self.pending), {}
+                written_at = await asyncio.to_thread(self._write, user_ids)
+                on_written(user_ids, written_at, time.time())
+
+
+class Recorder:
+    """Ground truth and client observations for one strategy run"""
+
+    def __init__(self, active_window: int):
+        self.active_window = active_window
+        self.truth: Dict[str, List[Tuple[str, float]]] = {}  # user -> [(status, since)]
+        self.last_heartbeat: Dict[str, int] = {}
+        self.observed: Dict[str, List[Tuple[str, float]]] = {}
+        self.latencies: List[float] = []
+
+    def heartbeats_written(self, user_ids: List[str], stored_at: int, committed_at: float):
+        for user_id in user_ids:
+            if user_id not in self.last_heartbeat or stored_at - self.last_heartbeat[user_id] > self.active_window:
+                self.truth.setdefault(user_id, []).append(("active", committed_at))
+            self.last_heartbeat[user_id] = stored_at
+
+    def went_offline(self, user_id: str):
+        last_heartbeat = self.last_heartbeat.get(user_id)
+        if last_heartbeat is not None:
+            self.truth.setdefault(user_id, []).append(("inactive", last_heartbeat + self.active_window))
+
+    def observe(self, user_id: str, status: str):
+        history = self.observed.setdefault(user_id, [])
+        if not history or history[-1][0] != status:
+            history.append((status, time.time()))
+
+    def staleness(self) -> List[float]:
+        """For every observed change, how long after the real change it was seen"""
+        result = []
+        for user_id, observations in self.observed.items():
+            truth = self.truth.get(user_id, [])
+            for status, seen_at in observations:
+                changes = [since for truth_status, since in truth if truth_status == status and since <= seen_at]
+                if changes:
+                    result.append(seen_at - changes[-1])
+        return result
+
+
+async def simulate_user(user_id: str, writer: HeartbeatWriter, recorder: Recorder, args, stop: asyncio.Event):
+    """Alternate between online (sending heartbeats) and offline long enough to expire"""
+    await asyncio.sleep(random.uniform(0, args.offline_seconds))
+    while not stop.is_set():
+        online_until = time.time() + random.uniform(0.5, 1.5) * args.online_seconds
+        while time.time() < online_until and not stop.is_set():
+            writer.beat(user_id)
+            await asyncio.sleep(args.heartbeat_interval)
+        recorder.went_offline(user_id)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=random.uniform(1.0, 1.5) * args.offline_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def watch_short_poll(session, base_url, user_id, recorder: Recorder, stop: asyncio.Event, interval: float):
+    await asyncio.sleep(random.uniform(0, interval))
+    while not stop.is_set():
+        started = time.time()
+        async with session.get(f"{base_url}/short-poll/{user_id}") as response:
+            result = await response.json()
+        recorder.latencies.append(time.time() - started)
+        recorder.observe(user_id, result["status"])
+        await asyncio.sleep(interval)
+
+
+async def watch_long_poll(session, base_url, user_id, recorder: Recorder, stop: asyncio.Event, timeout: float):
+    version = None
+    while not stop.is_set():
+        params = {"timeout": timeout}
+        if version:
+            params["since"] = version
+        started = time.time()
+        async with session.get(f"{base_url}/long-poll/{user_id}", params=params) as response:
+            if response.status == 200:
+                result = await response.json()
+                version = result["version"]
+                recorder.observe(user_id, result["status"])
+        recorder.latencies.append(time.time() - started)
+
+
+async def watch_stream(session, base_url, user_id, recorder: Recorder, stop: asyncio.Event):
+    started = time.time()
+    async with session.get(f"{base_url}/stream", params={"user_ids": user_id}) as response:
+        first = True
+        async for line in response.content:
+            if stop.is_set():
+                break
+            if line.startswith(b"data: "):
+                if first:
+                    recorder.latencies.append(time.time() - started)
+                    first = False
+                recorder.observe(user_id, json.loads(line[len(b"data: "):])["status"])
+
+
+async def run_strategy(strategy: str, args) -> dict:
+    run_id = uuid.uuid4().hex[:6]
+    user_ids = [f"load-{run_id}-{i}" for i in range(args.users)]
+    recorder = Recorder(args.active_window)
+    writer = HeartbeatWriter()
+    stop = asyncio.Event()
+
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=None)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        async with session.get(f"{args.base_url}/stats") as response:
+            before = await response.json()
+        started = time.time()
+
+        tasks = [asyncio.create_task(writer.run(stop, recorder.heartbeats_written))]
+        for user_id in user_ids:
+            tasks.append(asyncio.create_task(simulate_user(user_id, writer, recorder, args, stop)))
+            if strategy == "short-poll":
+                watcher = watch_short_poll(session, args.base_url, user_id, recorder, stop, args.poll_interval)
+            elif strategy == "long-poll":
+                watcher = watch_long_poll(session, args.base_url, user_id, recorder, stop, args.hold_timeout)
+            else:
+                watcher = watch_stream(session, args.base_url, user_id, recorder, stop)
+            tasks.append(asyncio.create_task(watcher))
+
+        await asyncio.sleep(args.duration)
+        stop.set()
+        elapsed = time.time() - started
+        async with session.get(f"{args.base_url}/stats") as response:
+            after = await response.json()
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    staleness = recorder.staleness()
+    return {
+        "strategy": strategy,
+        "requests_per_sec": (after["requests"] - before["requests"]) / elapsed,
+        "db_queries_per_sec": (after["db_queries"] - before["db_queries"]) / elapsed,
+        "staleness_p50": percentile(staleness, 50),
+        "staleness_p99": percentile(staleness, 99),
+        "latency_p50": percentile(recorder.latencies, 50),
+        "latency_p99": percentile(recorder.latencies, 99),
+        "changes_seen": len(staleness),
+    }
+
+
+def print_report(results: List[dict]):
+    print(f"\n{'strategy':>10} | {'req/s':>8} | {'db q/s':>8} | {'stale p50':>9} | {'stale p99':>9} | "
+          f"{'lat p50':>8} | {'lat p99':>8} | {'changes':>7}")
+    print("-" * 92)
+    for r in results:
+        print(f"{r['strategy']:>10} | {r['requests_per_sec']:8.1f} | {r['db_queries_per_sec']:8.1f} | "
+              f"{r['staleness_p50']:8.2f}s | {r['staleness_p99']:8.2f}s | "
+              f"{r['latency_p50'] * 1000:6.1f}ms | {r['latency_p99'] * 1000:6.1f}ms | {r['changes_seen']:7d}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare polling strategies under load")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=60, help="seconds per strategy")
+    parser.add_argument("--strategies", default=",".join(STRATEGIES))
+    parser.add_argument("--heartbeat-interval", type=float, default=5)
+    parser.add_argument("--online-seconds", type=float, default=20)
+    parser.add_argument("--offline-seconds", type=float, default=40)
+    parser.add_argument("--poll-interval", type=float, default=1, help="short poll period")
+    parser.add_argument("--hold-timeout", type=float, default=30, help="long poll hold")
+    parser.add_argument("--active-window", type=int, default=polling_simple.ACTIVE_WINDOW,
+                        help="in-process only: shrink the 30s window for shorter runs")
+    parser.add_argument("--base-url", default=None, help="use a running server instead of in-process")
+    parser.add_argument("--port", type=int, default=8011)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    init_shards()
+
+    if args.base_url is None:
+        polling_simple.ACTIVE_WINDOW = args.active_window
+        start_in_process_server(args.port)
+        args.base_url = f"http://127.0.0.1:{args.port}"
+    elif args.active_window != polling_simple.ACTIVE_WINDOW:
+        print("--active-window only applies in-process, using the server's window")
+        args.active_window = polling_simple.ACTIVE_WINDOW
+
+    print(f"{args.users} users, heartbeat every {args.heartbeat_interval}s, "
+          f"{args.duration:.0f}s per strategy against {args.base_url}")
+    results = []
+    for strategy in args.strategies.split(","):
+        print(f"Running {strategy}...")
+        results.append(asyncio.run(run_strategy(strategy, args)))
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
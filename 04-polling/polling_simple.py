@@ -1,37 +1,344 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import Dict, List, Optional, Set, Tuple
+import heapq
+import json
+import logging
+import os
+import random
 import sqlite3
+import sys
+import threading
 import time
 import asyncio
 import uvicorn
 
+# Route users with the same consistent-hash ring as the sharding service
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sharding"))
+from hash_ring import ConsistentHashRing
+
 app = FastAPI()
 
+# Same shard files the sharding service writes to
+DB_NAMES = ["sharding.db", "sharding2.db"]
+
+ACTIVE_WINDOW = 30  # seconds since last heartbeat to count as "active"
+
+# SQLite caps bound parameters at 999 on older builds, keep one IN (...) under it
+MAX_BATCH_SIZE = 900
+
+STREAM_REFRESH_INTERVAL = 1.0  # how often the shared watcher re-reads the shards
+STREAM_QUEUE_SIZE = 100  # per-connection event buffer, oldest events dropped when full
+STREAM_KEEPALIVE = 15  # seconds between SSE comments on an idle stream
+
+LONG_POLL_TIMEOUT = 30  # default hold when the state has not changed
+MAX_LONG_POLL_TIMEOUT = 120
+LONG_POLL_JITTER = 0.1  # +/- 10% on every hold so reconnects don't arrive in lockstep
+
+# Server-side counters, read by load_test.py through GET /stats
+STATS = {"requests": 0, "db_queries": 0}
+stats_lock = threading.Lock()  # shard queries run in worker threads
+
+def count_db_query():
+    with stats_lock:
+        STATS["db_queries"] += 1
+
+class BatchStatusRequest(BaseModel):
+    user_ids: List[str]
+
+
+ring = ConsistentHashRing(DB_NAMES)
+
+def get_shard(user_id: str) -> str:
+    """Database file that owns this user, same answer as sharding/sharding.py"""
+    return ring.get_node(user_id)
+
 def get_user_status(user_id: str) -> dict:
-    conn = sqlite3.connect("sharding.db")
+    count_db_query()
+    conn = sqlite3.connect(get_shard(user_id))
     cursor = conn.cursor()
     cursor.execute('SELECT last_heartbeat FROM heartbeats WHERE user_id = ?', (user_id,))
     result = cursor.fetchone()
     conn.close()
     
-    if result and (time.time() - result[0]) <= 30:
+    if result and (time.time() - result[0]) <= ACTIVE_WINDOW:
         return {"status": "active", "last_heartbeat": result[0]}
     return {"status": "inactive", "last_heartbeat": None}
 
+def get_shard_heartbeats(db_name: str, user_ids: List[str]) -> Dict[str, int]:
+    """One IN (...) query for every user that lives on this shard"""
+    placeholders = ",".join("?" for _ in user_ids)
+    count_db_query()
+    conn = sqlite3.connect(db_name)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f'SELECT user_id, last_heartbeat FROM heartbeats WHERE user_id IN ({placeholders})',
+            user_ids,
+        )
+        return dict(cursor.fetchall())
+    finally:
+        conn.close()
+
+async def get_batch_status(user_ids: List[str]) -> Dict[str, Optional[int]]:
+    """Group users by shard and query every shard concurrently"""
+    by_shard: Dict[str, List[str]] = {}
+    for user_id in dict.fromkeys(user_ids):  # de-duplicate, keep order
+        by_shard.setdefault(get_shard(user_id), []).append(user_id)
+
+    # sqlite3 is blocking, so each shard query runs in its own worker thread
+    shard_results = await asyncio.gather(*(
+        asyncio.to_thread(get_shard_heartbeats, db_name, ids)
+        for db_name, ids in by_shard.items()
+    ))
+
+    heartbeats = {}
+    for result in shard_results:
+        heartbeats.update(result)
+
+    now = time.time()
+    statuses = {}
+    for ids in by_shard.values():
+        for user_id in ids:
+            last_heartbeat = heartbeats.get(user_id)
+            if last_heartbeat is not None and (now - last_heartbeat) <= ACTIVE_WINDOW:
+                statuses[user_id] = last_heartbeat
+            else:
+                statuses[user_id] = None
+    return statuses
+
+class PresenceHub:
+    """
+    Shared watcher behind every streaming connection.
+
+    One task refreshes all watched users with one batch query per shard and
+    keeps a heap of expiry deadlines, so a user flips to inactive exactly when
+    their 30s window lapses. Connections only read from their own queue.
+    """
+
+    def __init__(self, refresh_interval: float = STREAM_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self.heartbeats: Dict[str, Optional[int]] = {}  # None means inactive
+        self.expiries: List[Tuple[float, str]] = []  # heap of (deadline, user_id)
+        self.lookups: Dict[str, asyncio.Future] = {}  # initial status query still running per user
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    async def subscribe(self, user_ids: List[str]) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        new_ids = [user_id for user_id in user_ids if user_id not in self.subscribers]
+        for user_id in user_ids:
+            self.subscribers.setdefault(user_id, set()).add(queue)
+
+        try:
+            if new_ids:
+                lookup = asyncio.ensure_future(self._lookup(new_ids))
+                for user_id in new_ids:
+                    self.lookups[user_id] = lookup
+            # Users another subscriber is still looking up are only known once that query lands.
+            # Shielded: one client going away must not cancel the lookup the others wait on.
+            running = {self.lookups[user_id] for user_id in user_ids if user_id in self.lookups}
+            if running:
+                await asyncio.shield(asyncio.gather(*running))
+        except BaseException:
+            self.unsubscribe(queue, user_ids)
+            raise
+
+        # Snapshot first, then only transitions
+        for user_id in user_ids:
+            self._offer(queue, self._event(user_id))
+
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        self.wakeup.set()  # new expiry deadlines may be earlier than the current sleep
+        return queue
+
+    async def _lookup(self, user_ids: List[str]):
+        """Initial status of newly watched users"""
+        try:
+            for chunk_start in range(0, len(user_ids), MAX_BATCH_SIZE):
+                statuses = await get_batch_status(user_ids[chunk_start:chunk_start + MAX_BATCH_SIZE])
+                for user_id, last_heartbeat in statuses.items():
+                    if user_id in self.subscribers:
+                        self._track(user_id, last_heartbeat)
+        finally:
+            current = asyncio.current_task()
+            for user_id in user_ids:
+                if self.lookups.get(user_id) is current:
+                    del self.lookups[user_id]
+
+    def unsubscribe(self, queue: asyncio.Queue, user_ids: List[str]):
+        for user_id in user_ids:
+            queues = self.subscribers.get(user_id)
+            if queues is None:
+                continue
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+                self.heartbeats.pop(user_id, None)
+
+    def _event(self, user_id: str) -> dict:
+        last_heartbeat = self.heartbeats.get(user_id)
+        return {
+            "user_id": user_id,
+            "status": "active" if last_heartbeat is not None else "inactive",
+            "last_heartbeat": last_heartbeat,
+            "at": time.time(),
+        }
+
+    def _offer(self, queue: asyncio.Queue, event: dict):
+        if queue.full():
+            queue.get_nowait()  # a slow reader loses its oldest event, not the newest
+        queue.put_nowait(event)
+
+    def _track(self, user_id: str, last_heartbeat: Optional[int]):
+        """Record the latest heartbeat and schedule its expiry"""
+        if last_heartbeat is not None and last_heartbeat != self.heartbeats.get(user_id):
+            heapq.heappush(self.expiries, (last_heartbeat + ACTIVE_WINDOW, user_id))
+        self.heartbeats[user_id] = last_heartbeat
+
+    def _update(self, user_id: str, last_heartbeat: Optional[int]):
+        if user_id not in self.subscribers:
+            return
+        was_active = self.heartbeats.get(user_id) is not None
+        self._track(user_id, last_heartbeat)
+        if was_active != (last_heartbeat is not None):
+            event = self._event(user_id)
+            for queue in self.subscribers[user_id]:
+                self._offer(queue, event)
+
+    def _expire_due(self):
+        now = time.time()
+        while self.expiries and self.expiries[0][0] <= now:
+            deadline, user_id = heapq.heappop(self.expiries)
+            last_heartbeat = self.heartbeats.get(user_id)
+            # Skip entries superseded by a newer heartbeat
+            if last_heartbeat is not None and last_heartbeat + ACTIVE_WINDOW == deadline:
+                self._update(user_id, None)
+
+    async def _refresh(self):
+        user_ids = list(self.subscribers)
+        for chunk_start in range(0, len(user_ids), MAX_BATCH_SIZE):
+            statuses = await get_batch_status(user_ids[chunk_start:chunk_start + MAX_BATCH_SIZE])
+            for user_id, last_heartbeat in statuses.items():
+                self._update(user_id, last_heartbeat)
+
+    async def _run(self):
+        next_refresh = time.time() + self.refresh_interval
+        while self.subscribers:
+            self._expire_due()
+            if time.time() >= next_refresh:
+                try:
+                    await self._refresh()
+                except Exception:
+                    # Keep the hub alive, live streams just miss one refresh
+                    logging.exception("Refreshing watched users failed")
+                next_refresh = time.time() + self.refresh_interval
+
+            wake_at = next_refresh
+            if self.expiries:
+                wake_at = min(wake_at, self.expiries[0][0])
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=max(0, wake_at - time.time()))
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+        self.expiries.clear()
+
+
+presence_hub = PresenceHub()
+
+@app.middleware("http")
+async def count_requests(request, call_next):
+    if request.url.path != "/stats":
+        STATS["requests"] += 1
+    return await call_next(request)
+
+@app.get("/stats")
+async def stats():
+    return STATS
+
 # SHORT POLL: Client pings every second
 @app.get("/short-poll/{user_id}")
 async def short_poll(user_id: str):
     return get_user_status(user_id)
 
-# LONG POLL: Server checks internally until change or timeout
+# BATCH POLL: One request for many users, one query per shard
+# Response maps user_id -> last_heartbeat, or null when the user is inactive
+@app.post("/short-poll/batch")
+async def short_poll_batch(request: BatchStatusRequest):
+    if len(request.user_ids) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} user_ids per batch")
+    return {"users": await get_batch_status(request.user_ids)}
+
+# LONG POLL: Server holds the request until the state differs from the client's version
+# The version (also sent as ETag) is the status itself, heartbeats that keep a user
+# active don't count as a change. Without a version the request waits for "active",
+# and always answers 200 with the status: a 304 needs a validator from the client.
 @app.get("/long-poll/{user_id}")
-async def long_poll(user_id: str):
-    for _ in range(30):  # Check for 30 seconds
-        status = get_user_status(user_id)
-        if status["status"] == "active":
-            return status
-        await asyncio.sleep(1)
-    
-    return get_user_status(user_id)  # Return final status
+async def long_poll(
+    user_id: str,
+    since: Optional[str] = None,
+    timeout: float = LONG_POLL_TIMEOUT,
+    if_none_match: Optional[str] = Header(None),
+):
+    version = since or if_none_match
+    seen = (version or "inactive").replace("W/", "").strip('"')
+    hold = min(max(timeout, 0), MAX_LONG_POLL_TIMEOUT)
+    hold *= random.uniform(1 - LONG_POLL_JITTER, 1 + LONG_POLL_JITTER)
+    deadline = time.time() + hold
+
+    # Wait on the shared hub instead of re-querying the shard every second
+    queue = await presence_hub.subscribe([user_id])
+    try:
+        event = queue.get_nowait()  # snapshot
+        while event["status"] == seen:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+    finally:
+        presence_hub.unsubscribe(queue, [user_id])
+
+    etag = f'"{event["status"]}"'
+    if event["status"] == seen and version is not None:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(
+        {"status": event["status"], "last_heartbeat": event["last_heartbeat"], "version": event["status"]},
+        headers={"ETag": etag},
+    )
+
+# STREAM: Client subscribes once, server pushes active/inactive transitions (SSE)
+@app.get("/stream")
+async def stream(user_ids: str):
+    ids = list(dict.fromkeys(user_id for user_id in user_ids.split(",") if user_id))
+    if not ids or len(ids) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Pass 1 to {MAX_BATCH_SIZE} comma-separated user_ids")
+    queue = await presence_hub.subscribe(ids)
+
+    async def event_stream():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            presence_hub.unsubscribe(queue, ids)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8001)
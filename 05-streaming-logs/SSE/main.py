@@ -1,39 +1,82 @@
 import os
+
+# SERVING_MODE=eventlet serves every stream from a greenlet instead of an OS thread.
+# Monkey patching must run before anything imports socket, threading or time.
+SERVING_MODE = os.environ.get("SERVING_MODE", "threading")
+if SERVING_MODE == "eventlet":
+    import eventlet
+    eventlet.monkey_patch()
+
+import sys
 import time
 import datetime
+import json
+import random
+from itertools import islice
 from threading import Thread
 from uuid import uuid4
 
 from faker import Faker
-from flask import Flask, Response, redirect, render_template
+from flask import Flask, Response, jsonify, redirect, render_template, request
+
+# Shared streaming code lives next to the SSE and WebSocket folders
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from logstream.fanout import COALESCE, POLICIES, Gap
+from logstream.filters import LEVELS, LineFilter
+from logstream.framing import frames
+from logstream.search import search
+from logstream.segments import SegmentWriter
+from logstream.serving import SERVING_MODES, raise_open_files_limit
+from logstream.storage import LogCatalog
+from logstream.tailer import TailerRegistry
 
 DATASETS_LOGS = "./data"
+SUBSCRIBER_BUFFER = 1000  # lines queued per viewer before the slow-consumer policy kicks in
+SLOW_CONSUMER_POLICY = COALESCE  # default, a client can pick another with ?policy=
+KEEPALIVE_SECONDS = 15  # SSE comment on a quiet stream, also detects closed clients
+BATCH_MAX_LINES = 200  # lines per batched frame
+BATCH_MAX_WAIT = 0.005  # seconds to keep collecting after the first line
+BACKFILL_LINES = 50  # history sent to a new viewer before live lines
+MAX_BACKFILL_LINES = 1000
+LEVEL_WEIGHTS = (20, 65, 10, 5)  # how often mock deployments log DEBUG, INFO, WARNING, ERROR
+MAX_SEARCH_RESULTS = 10000
+SEGMENT_MAX_BYTES = 1 << 20  # rotate a deployment's log every 1MB...
+SEGMENT_MAX_AGE = 600  # ...or every 10 minutes, then compress the old segment
+MAX_CONNECTIONS = int(os.environ.get("MAX_CONNECTIONS", 20000))  # concurrent streams in eventlet mode
 
 fake = Faker()
 app = Flask(__name__)
 
+if SERVING_MODE not in SERVING_MODES:
+    raise SystemExit(f"SERVING_MODE must be one of {SERVING_MODES}")
+
+# Deployment logs: segment directories with a manifest, or legacy single files
+logs = LogCatalog(DATASETS_LOGS)
+
+# One tailer thread per deployment, shared by all of its viewers
+tailers = TailerRegistry(subscriber_buffer=SUBSCRIBER_BUFFER, policy=SLOW_CONSUMER_POLICY)
+
 
 def mock_deployment(deployment_id: str):
-    """Simulate a deployment by writing logs to a file"""
-    filepath = os.path.join(DATASETS_LOGS, f"{deployment_id}.log")
+    """Simulate a deployment by writing logs to rotated segments"""
+    writer = SegmentWriter(logs.directory_for(deployment_id), max_bytes=SEGMENT_MAX_BYTES, max_age=SEGMENT_MAX_AGE)
     
-    with open(filepath, "w", encoding="utf-8") as fp:
+    try:
         for _ in range(100000):
             timestamp = datetime.datetime.now().isoformat()
-            log_entry = fake.text(max_nb_chars=64)
-            fp.write(f"{timestamp}: {log_entry}\n")
-            fp.flush()
+            level = random.choices(LEVELS, weights=LEVEL_WEIGHTS)[0]
+            log_entry = f"{level} {fake.text(max_nb_chars=64)}"
+            writer.write(f"{timestamp}: {log_entry}")
             time.sleep(0.5)
+    finally:
+        writer.close()
 
 
 @app.route("/", methods=["GET"])
 def index_handler():
     """Show all previous deployments"""
-    deployments = [
-        x.split(".")[0] for x in os.listdir(DATASETS_LOGS) 
-        if x.endswith(".log")
-    ]
-    return render_template("index.html", deployments=deployments)
+    # Line counts, sizes and time bounds come from each deployment's manifest
+    return render_template("index.html", deployments=logs.summaries())
 
 
 @app.route("/deployments/<deployment_id>", methods=["GET"])
@@ -52,24 +95,81 @@ def create_deployment_handler():
     return redirect(f"/deployments/{deployment_id}", 301)
 
 
-def log_tailer(deployment_id: str):
-    """Generator function that tails a log file and yields new lines"""
-    filepath = os.path.join(DATASETS_LOGS, f"{deployment_id}.log")
-    
-    # Wait for file to exist
-    while not os.path.exists(filepath):
-        time.sleep(0.1)
-    
-    with open(filepath, "r", encoding="utf-8") as fp:
-        # Go to end of file
-        fp.seek(0, 2)
-        
-        while True:
-            line = fp.readline()
-            if not line:
-                time.sleep(0.1)
-                continue
-            yield f"data: {line.strip()}\n\n"
+def batch_event(lines, offset: int) -> str:
+    """`id:` is the byte offset after the last line, the browser sends it back as Last-Event-ID"""
+    return f"id: {offset}\nevent: batch\ndata: {json.dumps(lines, separators=(',', ':'))}\n\n"
+
+
+def history_events(history, batch: bool):
+    """Backfilled or replayed lines, framed like live ones and read lazily"""
+    history = iter(history)
+    if not batch:
+        for line in history:
+            yield f"id: {line.offset}\ndata: {line.text}\n\n"
+        return
+    while True:
+        chunk = list(islice(history, BATCH_MAX_LINES))
+        if not chunk:
+            return
+        yield "".join(batch_event(payload, offset) for _, payload, offset in frames(chunk))
+
+
+def batched_events(subscription, after: int):
+    """
+    Batch mode: one `batch` event per few milliseconds of lines, payload is
+    [[timestamp, message], ...] so framing and write syscalls are paid per batch.
+    """
+    while True:
+        items = subscription.get_batch(BATCH_MAX_LINES, BATCH_MAX_WAIT, timeout=KEEPALIVE_SECONDS)
+        if not items:
+            if subscription.closed:
+                yield f"event: slow\ndata: {subscription.close_reason}\n\n"
+                return
+            yield ": keep-alive\n\n"
+            continue
+
+        events = []
+        for kind, payload, offset in frames(items, after):
+            if kind == "gap":
+                events.append(f"event: gap\ndata: {payload}\n\n")
+            else:
+                events.append(batch_event(payload, offset))
+        if events:
+            yield "".join(events)
+
+
+def line_events(subscription, after: int):
+    """Unbatched mode: one `data:` event per line"""
+    while True:
+        line = subscription.get(timeout=KEEPALIVE_SECONDS)
+        if isinstance(line, Gap):
+            yield f"event: gap\ndata: {line.count}\n\n"
+        elif line is not None:
+            if line.offset > after:
+                yield f"id: {line.offset}\ndata: {line.text}\n\n"
+        elif subscription.closed:
+            # Dropped by the disconnect policy, the browser reconnects on its own
+            yield f"event: slow\ndata: {subscription.close_reason}\n\n"
+            return
+        else:
+            yield ": keep-alive\n\n"
+
+
+def log_tailer(subscription, history=(), after: int = 0, batch: bool = True):
+    """
+    Generator that yields the history, then new lines from the deployment's
+    shared tailer. Live lines ending at or before `after` were part of the
+    history and are skipped.
+    """
+    try:
+        yield from history_events(history, batch)
+        if batch:
+            yield from batched_events(subscription, after)
+        else:
+            yield from line_events(subscription, after)
+    finally:
+        # Runs when the client disconnects and Flask closes the generator
+        subscription.close()
 
 
 @app.route("/logs/<deployment_id>")
@@ -84,7 +184,47 @@ def stream_logs_handler(deployment_id):
     The key is setting the mimetype to 'text/event-stream' which tells
     the browser this is an SSE stream.
     """
-    logs_stream = log_tailer(deployment_id)
+    policy = request.args.get("policy", SLOW_CONSUMER_POLICY)
+    if policy not in POLICIES:
+        return jsonify({"error": f"policy must be one of {POLICIES}"}), 400
+
+    try:
+        backfill = min(int(request.args.get("backfill", BACKFILL_LINES)), MAX_BACKFILL_LINES)
+        # Set by the browser on reconnect: the offset after the last line it received
+        resume_offset = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+        resume_offset = int(resume_offset) if resume_offset else None
+        from_line = request.args.get("from_line")
+        from_line = int(from_line) if from_line else None
+    except ValueError:
+        return jsonify({"error": "backfill, Last-Event-ID and from_line must be integers"}), 400
+    try:
+        # ?level=ERROR&contains=...&regex=...&since=...&until=..., applied in the shared tailer
+        line_filter = LineFilter.from_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    log = logs.open(deployment_id)
+    # Subscribe first so nothing written while the history is read gets lost
+    subscription = tailers.subscribe(log, policy=policy, label=request.remote_addr or "",
+                                     line_filter=line_filter)
+    end = log.end()
+
+    start = None
+    if resume_offset is not None:
+        start = log.line_start(resume_offset)
+    elif from_line is not None:
+        start = log.offset_of_line(from_line)
+
+    if start is not None:
+        # Continue exactly where the client left off, reading forward from that offset
+        history = log.read_lines(start, end)
+        after = max(start, end)
+    else:
+        history = log.tail_lines(backfill, end=end)
+        after = end
+    if line_filter is not None:
+        history = line_filter.apply(history)
+    logs_stream = log_tailer(subscription, history, after, batch=request.args.get("batch", "1") != "0")
     return Response(
         logs_stream, 
         mimetype="text/event-stream",
@@ -95,8 +235,38 @@ def stream_logs_handler(deployment_id):
     )
 
 
+@app.route("/search")
+def search_handler():
+    """
+    Search old logs: same filters as the stream, plus ?deployment_id= and ?limit=.
+    Results stream back as one JSON object per line while the files are scanned.
+    """
+    try:
+        line_filter = LineFilter.from_params(request.args) or LineFilter()
+        limit = min(int(request.args.get("limit", 1000)), MAX_SEARCH_RESULTS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    deployment_id = request.args.get("deployment_id")
+    deployment_ids = [deployment_id] if deployment_id else logs.deployments()
+    results = search(((name, logs.open(name)) for name in deployment_ids), line_filter, limit)
+    return Response((json.dumps(result) + "\n" for result in results), mimetype="application/x-ndjson")
+
+
+@app.route("/stats")
+def stats_handler():
+    """Per-viewer lag: queued lines, seconds behind, dropped lines"""
+    return jsonify(tailers.stats())
+
+
 if __name__ == "__main__":
     # Ensure data directory exists
     os.makedirs(DATASETS_LOGS, exist_ok=True)
-    app.run(debug=True)
+    if SERVING_MODE == "eventlet":
+        # One greenlet per open stream, all parked in Subscription.get_batch
+        from eventlet import wsgi
+        raise_open_files_limit(MAX_CONNECTIONS + 1024)
+        wsgi.server(eventlet.listen(("127.0.0.1", 5000)), app, max_size=MAX_CONNECTIONS, log_output=False)
+    else:
+        app.run(debug=True)
 
@@ -1,92 +1,213 @@
 import os
+
+# SERVING_MODE=eventlet serves every stream from a greenlet instead of an OS thread.
+# Monkey patching must run before anything imports socket, threading or time.
+SERVING_MODE = os.environ.get("SERVING_MODE", "threading")
+if SERVING_MODE == "eventlet":
+    import eventlet
+    eventlet.monkey_patch()
+
+import sys
 import time
 import datetime
 import json
+import random
+from itertools import islice
 from threading import Thread
 from uuid import uuid4
 
 from faker import Faker
-from flask import Flask, render_template, redirect, request
+from flask import Flask, Response, render_template, redirect, request, jsonify
 from flask_socketio import SocketIO, emit, join_room, leave_room
+from socketio.exceptions import TimeoutError as AckTimeoutError
+
+# Shared streaming code lives next to the SSE and WebSocket folders
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from logstream.fanout import COALESCE, DISCONNECT, POLICIES, Gap
+from logstream.filters import LEVELS, LineFilter
+from logstream.framing import frames
+from logstream.search import search
+from logstream.segments import SegmentWriter
+from logstream.serving import SERVING_MODES, raise_open_files_limit
+from logstream.storage import LogCatalog
+from logstream.tailer import TailerRegistry
 
 DATASETS_LOGS = "./data"
+SUBSCRIBER_BUFFER = 1000  # lines queued per client before the slow-consumer policy kicks in
+SLOW_CONSUMER_POLICY = COALESCE  # default, a client can pick another in start_streaming
+ACK_TIMEOUT = 10  # seconds a client may take to acknowledge a message
+BATCH_MAX_LINES = 200  # lines per log_batch message
+BATCH_MAX_WAIT = 0.005  # seconds to keep collecting after the first line
+BACKFILL_LINES = 50  # history sent to a client before live lines
+LEVEL_WEIGHTS = (20, 65, 10, 5)  # how often mock deployments log DEBUG, INFO, WARNING, ERROR
+MAX_SEARCH_RESULTS = 10000
+SEGMENT_MAX_BYTES = 1 << 20  # rotate a deployment's log every 1MB...
+SEGMENT_MAX_AGE = 600  # ...or every 10 minutes, then compress the old segment
+MAX_CONNECTIONS = int(os.environ.get("MAX_CONNECTIONS", 20000))  # concurrent streams in eventlet mode
 
 fake = Faker()
 app = Flask(__name__)
+
+if SERVING_MODE not in SERVING_MODES:
+    raise SystemExit(f"SERVING_MODE must be one of {SERVING_MODES}")
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 
 # Initialize SocketIO with CORS support
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+# threading: one OS thread per client; eventlet: one greenlet per client on a single thread
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=SERVING_MODE)
 
 # Store active deployments and their background threads
 active_deployments = {}
 
 
 def mock_deployment(deployment_id: str):
-    """Simulate a deployment by writing logs to a file"""
-    filepath = os.path.join(DATASETS_LOGS, f"{deployment_id}.log")
+    """Simulate a deployment by writing logs to rotated segments"""
+    writer = SegmentWriter(logs.directory_for(deployment_id), max_bytes=SEGMENT_MAX_BYTES, max_age=SEGMENT_MAX_AGE)
     
-    with open(filepath, "w", encoding="utf-8") as fp:
+    try:
         for i in range(100000):
             timestamp = datetime.datetime.now().isoformat()
-            log_entry = fake.text(max_nb_chars=64)
+            level = random.choices(LEVELS, weights=LEVEL_WEIGHTS)[0]
+            log_entry = f"{level} {fake.text(max_nb_chars=64)}"
             log_line = f"{timestamp}: {log_entry}"
             
-            # Write to file
-            fp.write(f"{log_line}\n")
-            fp.flush()
+            # Append to the active segment, rotating when it is full
+            writer.write(log_line)
             
             time.sleep(0.5)
+    finally:
+        writer.close()
     
     # Clean up when done
     if deployment_id in active_deployments:
         del active_deployments[deployment_id]
 
 
-def log_tailer(deployment_id: str):
-    """Generator function that tails a log file and yields new lines via WebSocket"""
-    filepath = os.path.join(DATASETS_LOGS, f"{deployment_id}.log")
-    
-    # Wait for file to exist
-    while not os.path.exists(filepath):
-        time.sleep(0.1)
-    
-    with open(filepath, "r", encoding="utf-8") as fp:
-        # Go to end of file
-        fp.seek(0, 2)
-        
-        while True:
-            line = fp.readline()
-            if not line:
-                time.sleep(0.1)
-                continue
-            
-            # Parse the log line
-            parts = line.strip().split(': ', 1)
-            if len(parts) >= 2:
-                timestamp = parts[0]
-                message = parts[1]
-                
-                # Emit to WebSocket clients in this deployment's room
-                socketio.emit('new_log', {
-                    'timestamp': timestamp,
-                    'message': message,
-                    'full_line': line.strip()
-                }, room=deployment_id)
+# Deployment logs: segment directories with a manifest, or legacy single files
+logs = LogCatalog(DATASETS_LOGS)
+
+# One tailer thread per deployment, shared by all of its clients
+tailers = TailerRegistry(subscriber_buffer=SUBSCRIBER_BUFFER, policy=SLOW_CONSUMER_POLICY)
+
+# sid -> the client's Subscription
+client_subscriptions = {}
+
+
+def send(sid: str, subscription, event: str, payload: dict) -> bool:
+    """Send one message and wait for the ack, False once the client is given up on"""
+    try:
+        socketio.server.call(event, payload, to=sid, namespace='/', timeout=ACK_TIMEOUT)
+    except AckTimeoutError:
+        if subscription.policy == DISCONNECT:
+            subscription.close()
+            socketio.server.disconnect(sid)
+            return False
+    return True
+
+
+def messages(items, batch: bool, after: int = 0, historical: bool = False):
+    """
+    Turn buffered lines into (event, payload) messages. Each carries the byte
+    offset after its last line, which the client sends back as `resume_from`.
+    """
+    if batch:
+        for kind, payload, offset in frames(items, after):
+            if kind == 'gap':
+                yield 'lines_skipped', {'count': payload}
+            else:
+                yield 'log_batch', {'lines': payload, 'offset': offset, 'is_historical': historical}
+        return
+
+    for item in items:
+        if isinstance(item, Gap):
+            yield 'lines_skipped', {'count': item.count}
+            continue
+        parts = item.text.split(': ', 1)
+        if len(parts) < 2 or item.offset <= after:
+            continue
+        yield 'new_log', {
+            'timestamp': parts[0],
+            'message': parts[1],
+            'full_line': item.text,
+            'offset': item.offset,
+            'is_historical': historical
+        }
+
 
+def log_sender(sid: str, subscription, history=(), after: int = 0, batch: bool = True):
+    """
+    Drain one client's buffer into its socket, after its history.
 
-# Store active tailers
-active_tailers = {}
+    Every message waits for the browser's ack, so a slow client backs up in
+    its own bounded buffer (where the slow-consumer policy applies) instead
+    of in an unbounded socket queue or in the shared tailer. In batch mode a
+    message carries every line that arrived within a few milliseconds, so a
+    busy log costs one frame and one ack round trip per batch, not per line.
+    Live lines ending at or before `after` were part of the history.
+    """
+    max_lines = BATCH_MAX_LINES if batch else 1
+
+    history = iter(history)
+    while True:
+        chunk = list(islice(history, BATCH_MAX_LINES))
+        if not chunk or subscription.closed:
+            break
+        if not all(send(sid, subscription, event, payload)
+                   for event, payload in messages(chunk, batch, historical=True)):
+            return
+
+    while True:
+        items = subscription.get_batch(max_lines, BATCH_MAX_WAIT, timeout=1.0)
+        if not items:
+            if subscription.closed:
+                break
+            continue
+
+        if not all(send(sid, subscription, event, payload) for event, payload in messages(items, batch, after)):
+            break
+
+    if subscription.close_reason:
+        socketio.emit('status', {
+            'type': 'slow_consumer',
+            'message': f'Stream closed: {subscription.close_reason}'
+        }, to=sid)
+
+
+def close_subscription(sid: str):
+    subscription = client_subscriptions.pop(sid, None)
+    if subscription is not None:
+        subscription.close()
 
 
 @app.route("/", methods=["GET"])
 def index_handler():
     """Show all previous deployments"""
-    deployments = [
-        x.split(".")[0] for x in os.listdir(DATASETS_LOGS) 
-        if x.endswith(".log")
-    ]
-    return render_template("index.html", deployments=deployments)
+    # Line counts, sizes and time bounds come from each deployment's manifest
+    return render_template("index.html", deployments=logs.summaries())
+
+
+@app.route("/stats", methods=["GET"])
+def stats_handler():
+    """Per-client lag: queued lines, seconds behind, dropped lines"""
+    return jsonify(tailers.stats())
+
+
+@app.route("/search", methods=["GET"])
+def search_handler():
+    """
+    Search old logs: ?level=, ?contains=, ?regex=, ?since=, ?until=, ?deployment_id=, ?limit=.
+    Results stream back as one JSON object per line while the files are scanned.
+    """
+    try:
+        line_filter = LineFilter.from_params(request.args) or LineFilter()
+        limit = min(int(request.args.get("limit", 1000)), MAX_SEARCH_RESULTS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    deployment_id = request.args.get("deployment_id")
+    deployment_ids = [deployment_id] if deployment_id else logs.deployments()
+    results = search(((name, logs.open(name)) for name in deployment_ids), line_filter, limit)
+    return Response((json.dumps(result) + "\n" for result in results), mimetype="application/x-ndjson")
 
 
 @app.route("/deployments/<deployment_id>", methods=["GET"])
@@ -127,46 +248,51 @@ def handle_connect():
 def handle_disconnect():
     """Handle client disconnection"""
     print(f"Client disconnected: {request.sid}")
+    close_subscription(request.sid)
 
 
 @socketio.on('start_streaming')
 def handle_start_streaming(data):
     """Start streaming logs for a specific deployment"""
     deployment_id = data['deployment_id']
+    policy = data.get('policy', SLOW_CONSUMER_POLICY)
+    batch = data.get('batch', True)
+    resume_from = data.get('resume_from')
+    if policy not in POLICIES:
+        emit('status', {'type': 'error', 'message': f'policy must be one of {POLICIES}'})
+        return
+    try:
+        # {level, contains, regex, since, until}, applied once per line in the shared tailer
+        line_filter = LineFilter.from_params(data.get('filter') or {})
+    except ValueError as e:
+        emit('status', {'type': 'error', 'message': str(e)})
+        return
     join_room(deployment_id)
     
     print(f"Client {request.sid} started streaming deployment: {deployment_id}")
     
-    # Send existing logs from file if available (last 50 lines)
-    filepath = os.path.join(DATASETS_LOGS, f"{deployment_id}.log")
-    if os.path.exists(filepath):
-        try:
-            with open(filepath, "r", encoding="utf-8") as fp:
-                lines = fp.readlines()
-                recent_lines = lines[-50:] if len(lines) > 50 else lines
-                
-                for line in recent_lines:
-                    if line.strip():
-                        parts = line.strip().split(': ', 1)
-                        if len(parts) >= 2:
-                            timestamp = parts[0]
-                            message = parts[1]
-                            emit('new_log', {
-                                'timestamp': timestamp,
-                                'message': message,
-                                'full_line': line.strip(),
-                                'is_historical': True
-                            })
-        except Exception as e:
-            print(f"Error reading existing logs: {e}")
-    
-    # Start tailing logs for this deployment if not already started
-    if deployment_id not in active_tailers:
-        tailer_thread = Thread(target=log_tailer, args=(deployment_id,))
-        tailer_thread.daemon = True
-        tailer_thread.start()
-        active_tailers[deployment_id] = tailer_thread
-        print(f"Started log tailer for deployment: {deployment_id}")
+    # Subscribe first so nothing written while the history is read gets lost
+    log = logs.open(deployment_id)
+    close_subscription(request.sid)
+    subscription = tailers.subscribe(log, policy=policy, label=request.sid, line_filter=line_filter)
+    client_subscriptions[request.sid] = subscription
+    end = log.end()
+
+    # A reconnecting client sends the offset after the last line it got
+    start = None
+    if isinstance(resume_from, int):
+        start = log.line_start(resume_from)
+
+    if start is not None:
+        history = log.read_lines(start, end)
+        after = max(start, end)
+    else:
+        # Last lines of the file, read backwards from the end instead of readlines()
+        history = log.tail_lines(BACKFILL_LINES, end=end)
+        after = end
+    if line_filter is not None:
+        history = line_filter.apply(history)
+    socketio.start_background_task(log_sender, request.sid, subscription, history, after, batch)
     
     emit('status', {
         'type': 'streaming_started',
@@ -180,6 +306,7 @@ def handle_stop_streaming(data):
     """Stop streaming logs for a deployment"""
     deployment_id = data['deployment_id']
     leave_room(deployment_id)
+    close_subscription(request.sid)
     
     print(f"Client {request.sid} stopped streaming deployment: {deployment_id}")
     
@@ -200,8 +327,11 @@ if __name__ == "__main__":
     # Ensure data directory exists
     os.makedirs(DATASETS_LOGS, exist_ok=True)
     
-    print("Starting WebSocket server...")
+    print(f"Starting WebSocket server ({SERVING_MODE})...")
     print("Visit http://localhost:6758 to see the application")
     
-    # Run with SocketIO
-    socketio.run(app, debug=True, host='0.0.0.0', port=6758)
+    if SERVING_MODE == "eventlet":
+        raise_open_files_limit(MAX_CONNECTIONS + 1024)
+    
+    # Run with SocketIO, which picks the eventlet server itself in eventlet mode
+    socketio.run(app, debug=SERVING_MODE == "threading", host='0.0.0.0', port=6758)
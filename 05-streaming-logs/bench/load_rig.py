@@ -0,0 +1,367 @@
+"""
+Load rig: SSE vs WebSocket log streaming under the same load
+============================================================
+Writes one deployment's log at a fixed rate and line size, straight into the
+server's data directory (what mock_deployment does, only much faster), while
+N simulated viewers follow it over SSE or Socket.IO.
+
+Reports per transport:
+- end-to-end line latency percentiles: written to disk -> parsed by a client
+- delivered lines/sec, summed over all clients
+- server CPU (% of one core) and peak RSS, read from /proc/<pid>
+- dropped lines, clients disconnected as slow, clients lagging at the end
+
+Usage:
+    python load_rig.py --clients 200 --rate 500 --duration 30
+    python load_rig.py --transports sse --serving-mode eventlet --clients 2000
+    python load_rig.py --sse-url http://localhost:5000 --server-pid 1234   # running server
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import aiohttp
+import socketio
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, ".."))
+from logstream.segments import SegmentWriter
+
+TRANSPORTS = ["sse", "websocket"]
+SERVERS = {
+    "sse": {"dir": os.path.join(HERE, "..", "SSE"), "port": 5000},
+    "websocket": {"dir": os.path.join(HERE, "..", "WebSocket"), "port": 6758},
+}
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class ProcessSampler:
+    """
+    CPU time and resident memory of the server, from /proc. Counts the
+    process and its children: Flask's debug reloader serves from a child.
+    """
+
+    def __init__(self, pid: Optional[int]):
+        self.pid = pid
+        self.peak_rss_mb = 0.0
+
+    def pids(self) -> List[int]:
+        if self.pid is None:
+            return []
+        found, pending = [], [self.pid]
+        while pending:
+            pid = pending.pop()
+            found.append(pid)
+            try:
+                with open(f"/proc/{pid}/task/{pid}/children") as fp:
+                    pending.extend(int(child) for child in fp.read().split())
+            except FileNotFoundError:
+                pass
+        return found
+
+    def cpu_seconds(self) -> Optional[float]:
+        if self.pid is None:
+            return None
+        total = 0.0
+        for pid in self.pids():
+            try:
+                with open(f"/proc/{pid}/stat") as fp:
+                    # Fields after the ")" that closes the command name; utime and stime are 14 and 15
+                    fields = fp.read().rsplit(")", 1)[1].split()
+            except FileNotFoundError:
+                continue
+            total += (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+        return total
+
+    def sample_rss(self):
+        rss_kb = 0
+        for pid in self.pids():
+            try:
+                with open(f"/proc/{pid}/status") as fp:
+                    for line in fp:
+                        if line.startswith("VmRSS:"):
+                            rss_kb += int(line.split()[1])
+            except FileNotFoundError:
+                continue
+        self.peak_rss_mb = max(self.peak_rss_mb, rss_kb / 1024)
+
+
+class LogWriter:
+    """Appends `rate` lines/sec of `line_size` bytes, remembering when each timestamp was written"""
+
+    def __init__(self, directory: str, rate: int, line_size: int):
+        self.writer = SegmentWriter(directory)
+        self.rate = rate
+        self.line_size = line_size
+        self.written_at: Dict[str, float] = {}  # timestamp in the line -> time.time() after the write
+        self.lines = 0
+        self.stopping = threading.Event()
+
+    def run(self):
+        tick = 0.01
+        per_tick = self.rate * tick
+        due = 0.0
+        next_tick = time.monotonic()
+        while not self.stopping.is_set():
+            due += per_tick
+            while due >= 1:
+                timestamp = datetime.now().isoformat()
+                head = f"{timestamp}: INFO line {self.lines} "
+                self.writer.write(head + "x" * max(self.line_size - len(head), 0))
+                # Duplicate timestamps are possible at high rates, the first write wins
+                self.written_at.setdefault(timestamp, time.time())
+                self.lines += 1
+                due -= 1
+            next_tick += tick
+            time.sleep(max(next_tick - time.monotonic(), 0))
+        self.writer.close()
+
+
+class Results:
+    """Everything the clients of one run observed"""
+
+    def __init__(self, written_at: Dict[str, float]):
+        self.written_at = written_at
+        self.latencies: List[float] = []
+        self.delivered = 0
+        self.dropped = 0
+        self.slow_disconnects = 0
+        self.connected = 0
+        self.errors = 0
+
+    def lines(self, timestamps: List[str]):
+        now = time.time()
+        self.delivered += len(timestamps)
+        for timestamp in timestamps:
+            written = self.written_at.get(timestamp)
+            if written is not None:
+                self.latencies.append(now - written)
+
+
+async def sse_client(session: aiohttp.ClientSession, base_url: str, deployment_id: str,
+                     results: Results, stop: asyncio.Event):
+    try:
+        async with session.get(f"{base_url}/logs/{deployment_id}", params={"backfill": 0}) as response:
+            results.connected += 1
+            event = "message"
+            async for raw in response.content:
+                if stop.is_set():
+                    break
+                line = raw.rstrip(b"\n")
+                if line.startswith(b"event: "):
+                    event = line[len(b"event: "):].decode()
+                elif line.startswith(b"data: "):
+                    data = line[len(b"data: "):]
+                    if event == "batch":
+                        results.lines([timestamp for timestamp, _ in json.loads(data)])
+                    elif event == "gap":
+                        results.dropped += int(data)
+                    elif event == "slow":
+                        results.slow_disconnects += 1
+                        break
+                    else:
+                        results.lines([data.decode().split(": ", 1)[0]])
+                elif not line:
+                    event = "message"
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        results.errors += 1
+
+
+async def websocket_client(base_url: str, deployment_id: str, results: Results, stop: asyncio.Event):
+    client = socketio.AsyncClient(reconnection=False)
+
+    @client.on("log_batch")
+    async def on_batch(data):
+        if not data.get("is_historical"):
+            results.lines([timestamp for timestamp, _ in data["lines"]])
+        return True  # the ack the server waits for
+
+    @client.on("lines_skipped")
+    async def on_skipped(data):
+        results.dropped += data["count"]
+        return True
+
+    @client.on("status")
+    async def on_status(data):
+        if data.get("type") == "slow_consumer":
+            results.slow_disconnects += 1
+
+    try:
+        await client.connect(base_url, transports=["websocket"])
+        results.connected += 1
+        await client.emit("start_streaming", {"deployment_id": deployment_id, "batch": True})
+        await stop.wait()
+    except (socketio.exceptions.ConnectionError, aiohttp.ClientError):
+        results.errors += 1
+    finally:
+        await client.disconnect()
+
+
+def start_server(transport: str, serving_mode: str) -> subprocess.Popen:
+    server = SERVERS[transport]
+    os.makedirs(os.path.join(server["dir"], "data"), exist_ok=True)
+    env = dict(os.environ, SERVING_MODE=serving_mode)
+    return subprocess.Popen([sys.executable, "main.py"], cwd=server["dir"], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_until_up(base_url: str, timeout: float = 20):
+    deadline = time.time() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{base_url}/stats") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.time() > deadline:
+                raise SystemExit(f"server at {base_url} did not come up")
+            await asyncio.sleep(0.2)
+
+
+async def run_transport(transport: str, args, base_url: str, pid: Optional[int]) -> dict:
+    deployment_id = f"bench-{uuid.uuid4().hex[:8]}"
+    directory = os.path.join(args.data_dir or os.path.join(SERVERS[transport]["dir"], "data"), deployment_id)
+    writer = LogWriter(directory, args.rate, args.line_size)
+    results = Results(writer.written_at)
+    sampler = ProcessSampler(pid)
+    stop = asyncio.Event()
+
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=None)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        if transport == "sse":
+            clients = [sse_client(session, base_url, deployment_id, results, stop) for _ in range(args.clients)]
+        else:
+            clients = [websocket_client(base_url, deployment_id, results, stop) for _ in range(args.clients)]
+        tasks = []
+        for client in clients:
+            tasks.append(asyncio.create_task(client))
+            await asyncio.sleep(args.ramp / max(args.clients, 1))
+        await asyncio.sleep(1)  # let the last clients subscribe before lines start
+
+        thread = threading.Thread(target=writer.run, daemon=True)
+        thread.start()
+        cpu_before = sampler.cpu_seconds()
+        started = time.time()
+        delivered_before = results.delivered
+        while time.time() - started < args.duration:
+            sampler.sample_rss()
+            await asyncio.sleep(1)
+        elapsed = time.time() - started
+        cpu_after = sampler.cpu_seconds()
+
+        async with session.get(f"{base_url}/stats") as response:
+            subscriptions = [sub for path, subs in (await response.json()).items()
+                             if deployment_id in path for sub in subs]
+        lagging = sum(1 for sub in subscriptions if sub["lag_seconds"] > args.lag_threshold)
+
+        writer.stopping.set()
+        thread.join()
+        stop.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    if not args.keep_data:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        "transport": transport,
+        "clients": results.connected,
+        "written_per_sec": writer.lines / elapsed,
+        "delivered_per_sec": (results.delivered - delivered_before) / elapsed,
+        "latency_p50": percentile(results.latencies, 50),
+        "latency_p95": percentile(results.latencies, 95),
+        "latency_p99": percentile(results.latencies, 99),
+        "latency_max": max(results.latencies, default=0.0),
+        "dropped": results.dropped,
+        "slow": results.slow_disconnects,
+        "lagging": lagging,
+        "errors": results.errors,
+        "cpu_percent": (cpu_after - cpu_before) / elapsed * 100 if cpu_before is not None and cpu_after is not None else None,
+        "rss_mb": sampler.peak_rss_mb or None,
+    }
+
+
+def print_report(results: List[dict]):
+    print(f"\n{'transport':>9} | {'clients':>7} | {'written/s':>9} | {'deliv/s':>9} | {'p50':>7} | {'p95':>7} | "
+          f"{'p99':>7} | {'max':>7} | {'dropped':>7} | {'slow':>4} | {'lag':>4} | {'cpu':>5} | {'rss':>7}")
+    print("-" * 120)
+    for r in results:
+        cpu = f"{r['cpu_percent']:4.0f}%" if r["cpu_percent"] is not None else "    -"
+        rss = f"{r['rss_mb']:5.0f}MB" if r["rss_mb"] is not None else "      -"
+        print(f"{r['transport']:>9} | {r['clients']:7d} | {r['written_per_sec']:9.0f} | {r['delivered_per_sec']:9.0f} | "
+              f"{r['latency_p50'] * 1000:5.0f}ms | {r['latency_p95'] * 1000:5.0f}ms | "
+              f"{r['latency_p99'] * 1000:5.0f}ms | {r['latency_max'] * 1000:5.0f}ms | "
+              f"{r['dropped']:7d} | {r['slow']:4d} | {r['lagging']:4d} | {cpu} | {rss}")
+        if r["errors"]:
+            print(f"{'':>9}   {r['errors']} clients failed to connect")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare SSE and WebSocket log streaming under load")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--rate", type=int, default=200, help="log lines written per second")
+    parser.add_argument("--line-size", type=int, default=120, help="bytes per log line")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per transport")
+    parser.add_argument("--ramp", type=float, default=5, help="seconds to connect all clients")
+    parser.add_argument("--transports", default=",".join(TRANSPORTS))
+    parser.add_argument("--serving-mode", default="threading", choices=["threading", "eventlet"],
+                        help="SERVING_MODE for servers the rig starts")
+    parser.add_argument("--lag-threshold", type=float, default=1.0,
+                        help="seconds behind at the end to count a client as lagging")
+    parser.add_argument("--sse-url", default=None, help="use a running SSE server")
+    parser.add_argument("--ws-url", default=None, help="use a running WebSocket server")
+    parser.add_argument("--server-pid", type=int, default=None, help="pid of the running server, for CPU/RSS")
+    parser.add_argument("--data-dir", default=None, help="data directory of the running server")
+    parser.add_argument("--keep-data", action="store_true", help="keep the benchmark deployment's log")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print(f"{args.clients} clients, {args.rate} lines/s of {args.line_size} bytes, "
+          f"{args.duration:.0f}s per transport, {args.serving_mode}")
+
+    results = []
+    for transport in args.transports.split(","):
+        base_url = args.sse_url if transport == "sse" else args.ws_url
+        process = None
+        pid = args.server_pid
+        if base_url is None:
+            process = start_server(transport, args.serving_mode)
+            pid = process.pid
+            base_url = f"http://127.0.0.1:{SERVERS[transport]['port']}"
+        print(f"Running {transport} against {base_url}...")
+        try:
+            asyncio.run(wait_until_up(base_url))
+            results.append(asyncio.run(run_transport(transport, args, base_url, pid)))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
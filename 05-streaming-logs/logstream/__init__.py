@@ -0,0 +1 @@
+"""Log streaming building blocks shared by the SSE and WebSocket servers."""
@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, List, NamedTuple, Optional, Tuple, Union
+
+# What happens when a subscriber's buffer is full and another line arrives
+DROP_OLDEST = "drop_oldest"  # silently discard the oldest queued line
+COALESCE = "coalesce"  # discard it too, but tell the reader how many it missed
+DISCONNECT = "disconnect"  # give up on the reader, it can reconnect and resume
+POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+
+class LogLine(NamedTuple):
+    """A line of the log and the byte offset just past its newline"""
+    offset: int  # where to resume reading to get the line after this one
+    text: str
+
+
+class Gap:
+    """Stands in for lines a slow subscriber never received"""
+
+    __slots__ = ("count",)
+
+    def __init__(self, count: int):
+        self.count = count
+
+    def __repr__(self):
+        return f"Gap({self.count})"
+
+
+class Subscription:
+    """
+    One viewer's bounded buffer, filled by the shared tailer.
+
+    `push` never blocks, so a slow viewer can only hurt itself: its buffer
+    is capped at `maxsize` and the policy decides what to give up.
+    """
+
+    def __init__(self, maxsize: int, policy: str = COALESCE, label: str = "",
+                 on_close: Optional[Callable[["Subscription"], None]] = None, line_filter=None):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown slow-consumer policy {policy!r}, expected one of {POLICIES}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.label = label
+        self.on_close = on_close
+        self.line_filter = line_filter  # a LineFilter applied by the tailer, None for every line
+        self.items: Deque[Tuple[LogLine, float]] = deque()  # (line, enqueued_at)
+        self.cond = threading.Condition()
+        self.skipped = 0  # dropped since the last Gap was handed out
+        self.dropped = 0
+        self.delivered = 0
+        self.closed = False
+        self.close_reason: Optional[str] = None
+
+    def push(self, line: LogLine):
+        with self.cond:
+            if self.closed:
+                return
+            if len(self.items) >= self.maxsize:
+                if self.policy == DISCONNECT:
+                    self._close("slow consumer")
+                    return
+                self.items.popleft()
+                self.dropped += 1
+                if self.policy == COALESCE:
+                    self.skipped += 1
+            self.items.append((line, time.time()))
+            self.cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Union[LogLine, Gap, None]:
+        """Next line, a Gap marker for skipped lines, or None on timeout / close"""
+        with self.cond:
+            if not self.items and not self.closed:
+                self.cond.wait(timeout)
+            if self.skipped:
+                gap, self.skipped = Gap(self.skipped), 0
+                return gap
+            if not self.items:
+                return None
+            self.delivered += 1
+            return self.items.popleft()[0]
+
+    def get_batch(self, max_lines: int, max_wait: float,
+                  timeout: Optional[float] = None) -> List[Union[LogLine, Gap]]:
+        """
+        Wait up to `timeout` for a first item, then keep collecting for up to
+        `max_wait` seconds or `max_lines` items, whichever comes first.
+        Returns an empty list on timeout or close.
+        """
+        first = self.get(timeout)
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + max_wait
+        with self.cond:
+            while len(batch) < max_lines:
+                if self.skipped:
+                    batch.append(Gap(self.skipped))
+                    self.skipped = 0
+                    continue
+                if self.items:
+                    self.delivered += 1
+                    batch.append(self.items.popleft()[0])
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.closed:
+                    break
+                self.cond.wait(remaining)
+        return batch
+
+    def _close(self, reason: Optional[str]):
+        self.closed = True
+        self.close_reason = reason
+        self.cond.notify_all()
+        if self.on_close is not None:
+            self.on_close(self)
+
+    def close(self):
+        with self.cond:
+            if not self.closed:
+                self._close(None)
+
+    def stats(self) -> dict:
+        """How far behind this viewer is"""
+        with self.cond:
+            oldest_age = time.time() - self.items[0][1] if self.items else 0.0
+            return {
+                "label": self.label,
+                "policy": self.policy,
+                "filter": self.line_filter.to_dict() if self.line_filter is not None else None,
+                "queued": len(self.items),
+                "capacity": self.maxsize,
+                "lag_seconds": round(oldest_age, 3),
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+                "closed_reason": self.close_reason,
+            }
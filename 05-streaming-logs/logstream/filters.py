@@ -0,0 +1,92 @@
+import datetime
+import re
+from typing import Iterable, Iterator, Mapping, Optional
+
+from logstream.fanout import LogLine
+
+# Severity order, a level filter keeps that level and everything above it
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+
+def line_timestamp(text: str) -> str:
+    """The ISO timestamp a line starts with, `timestamp: LEVEL message`"""
+    return text.split(": ", 1)[0]
+
+
+def line_level(text: str) -> Optional[str]:
+    parts = text.split(": ", 1)
+    if len(parts) < 2:
+        return None
+    level = parts[1].split(" ", 1)[0]
+    return level if level in LEVELS else None
+
+
+def _timestamp(value: str) -> str:
+    """Normalise a user-supplied time so it compares like the log's isoformat() strings"""
+    return datetime.datetime.fromisoformat(value).isoformat()
+
+
+class LineFilter:
+    """
+    What a viewer wants to see: a minimum level, a substring, a regex and a
+    time range, all optional and all required to match.
+
+    Filters with the same settings compare equal, so the tailer evaluates each
+    distinct filter once per line however many viewers share it.
+    """
+
+    def __init__(self, level: Optional[str] = None, contains: Optional[str] = None,
+                 regex: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None):
+        if level and level.upper() not in LEVELS:
+            raise ValueError(f"level must be one of {LEVELS}")
+        self.level = level.upper() if level else None
+        self.levels = set(LEVELS[LEVELS.index(self.level):]) if self.level else None
+        self.contains = contains or None
+        self.regex = regex or None
+        try:
+            self.pattern = re.compile(regex) if regex else None
+        except re.error as e:
+            raise ValueError(f"invalid regex: {e}") from e
+        self.since = _timestamp(since) if since else None
+        self.until = _timestamp(until) if until else None
+        self.key = (self.level, self.contains, self.regex, self.since, self.until)
+
+    @classmethod
+    def from_params(cls, params: Mapping) -> Optional["LineFilter"]:
+        """Build from query args or a Socket.IO payload, None when nothing is filtered"""
+        line_filter = cls(
+            level=params.get("level"),
+            contains=params.get("contains"),
+            regex=params.get("regex"),
+            since=params.get("since"),
+            until=params.get("until"),
+        )
+        return line_filter if any(line_filter.key) else None
+
+    def __eq__(self, other):
+        return isinstance(other, LineFilter) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def matches(self, text: str) -> bool:
+        # Cheapest checks first, the regex only runs on lines that got this far
+        if self.contains is not None and self.contains not in text:
+            return False
+        if self.since is not None or self.until is not None:
+            timestamp = line_timestamp(text)
+            if self.since is not None and timestamp < self.since:
+                return False
+            if self.until is not None and timestamp > self.until:
+                return False
+        if self.levels is not None and line_level(text) not in self.levels:
+            return False
+        if self.pattern is not None and not self.pattern.search(text):
+            return False
+        return True
+
+    def apply(self, lines: Iterable[LogLine]) -> Iterator[LogLine]:
+        return (line for line in lines if self.matches(line.text))
+
+    def to_dict(self) -> dict:
+        return {name: value for name, value in zip(("level", "contains", "regex", "since", "until"), self.key) if value}
@@ -0,0 +1,34 @@
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from logstream.fanout import Gap, LogLine
+
+
+def split_line(line: str) -> List[str]:
+    """`timestamp: message` -> [timestamp, message], split once like the original tailers"""
+    parts = line.split(': ', 1)
+    if len(parts) < 2:
+        return ["", line]
+    return parts
+
+
+def frames(items: Iterable[Union[LogLine, Gap]], after: int = 0) -> Iterator[Tuple[str, object, Optional[int]]]:
+    """
+    Group a batch into frames: ("lines", [[timestamp, message], ...], offset)
+    for runs of lines and ("gap", count, None) wherever lines were skipped,
+    order preserved. `offset` is the resume position after the frame's last
+    line. Lines ending at or before `after` were already sent as history and
+    are dropped.
+    """
+    lines = []
+    offset = None
+    for item in items:
+        if isinstance(item, Gap):
+            if lines:
+                yield "lines", lines, offset
+                lines = []
+            yield "gap", item.count, None
+        elif item.offset > after:
+            lines.append(split_line(item.text))
+            offset = item.offset
+    if lines:
+        yield "lines", lines, offset
@@ -0,0 +1,114 @@
+import bisect
+import os
+import threading
+from typing import List, Optional
+
+from logstream.filters import line_timestamp
+from logstream.tail_reader import read_lines
+
+
+class OffsetIndex:
+    """
+    Sparse line-number -> byte-offset index for one log file.
+
+    Keeps the offset of every `every`-th line start, so finding any line or
+    checking any offset reads at most `every` lines from the nearest
+    checkpoint. The file is scanned once, then only the bytes appended since
+    the last lookup, which suits append-only logs.
+
+    The timestamp of each checkpoint line is kept too, so a time-range query
+    can seek close to its start instead of reading from the beginning.
+    """
+
+    def __init__(self, path: str, every: int = 1000, block_size: int = 1 << 20):
+        self.path = path
+        self.every = every
+        self.block_size = block_size
+        self.checkpoints: List[int] = [0]  # checkpoints[i] = offset where line i * every starts
+        self.timestamps: List[str] = []  # timestamps[i] = timestamp of that line, filled on demand
+        self.lines = 0  # complete lines scanned so far
+        self.scanned_to = 0  # offset just past the last complete line scanned
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        """Index whatever was appended since the last call"""
+        try:
+            fp = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with self.lock, fp:
+            if fp.seek(0, os.SEEK_END) < self.scanned_to:
+                # Truncated or replaced, start over
+                self.checkpoints, self.timestamps, self.lines, self.scanned_to = [0], [], 0, 0
+            # Bytes past scanned_to hold no newline yet, so reading from there is enough
+            fp.seek(self.scanned_to)
+            base = self.scanned_to
+            while True:
+                block = fp.read(self.block_size)
+                if not block:
+                    break
+                newlines = block.count(b"\n")
+                next_line = len(self.checkpoints) * self.every
+                counted = self.lines
+                position = -1
+                while next_line <= self.lines + newlines:
+                    # Line next_line starts right after the newline that ends line next_line - 1
+                    for _ in range(next_line - counted):
+                        position = block.find(b"\n", position + 1)
+                    counted = next_line
+                    self.checkpoints.append(base + position + 1)
+                    next_line += self.every
+                if newlines:
+                    self.lines += newlines
+                    self.scanned_to = base + block.rfind(b"\n") + 1
+                base += len(block)
+
+    def offset_of_line(self, line_no: int) -> Optional[int]:
+        """Byte offset where line `line_no` (0-based) starts, None past the end"""
+        self.refresh()
+        with self.lock:
+            if line_no < 0 or line_no > self.lines:
+                return None
+            offset = self.checkpoints[line_no // self.every]
+            skip = line_no % self.every
+        for line in read_lines(self.path, offset):
+            if skip == 0:
+                break
+            offset = line.offset
+            skip -= 1
+        return offset
+
+    def line_start(self, offset: int) -> Optional[int]:
+        """
+        Snap an untrusted offset (say, a client's Last-Event-ID) to the first
+        line starting at or after it. None if it lies beyond the indexed file.
+        """
+        self.refresh()
+        with self.lock:
+            if offset < 0 or offset > self.scanned_to:
+                return None
+            start = self.checkpoints[bisect.bisect_right(self.checkpoints, offset) - 1]
+        if start == offset:
+            return offset
+        for line in read_lines(self.path, start, self.scanned_to):
+            if line.offset >= offset:
+                return line.offset
+        return self.scanned_to
+
+    def offset_at_time(self, timestamp: str) -> int:
+        """
+        An offset at or before the first line stamped `timestamp` or later.
+
+        Lines are appended in time order, so the checkpoint timestamps are
+        sorted: bisect them and start from the last checkpoint that is still
+        earlier than `timestamp`. At most `every` lines are read for nothing.
+        """
+        self.refresh()
+        with self.lock, open(self.path, "rb") as fp:
+            # Only complete lines, the one at scanned_to may still be half written
+            while len(self.timestamps) < len(self.checkpoints) and self.checkpoints[len(self.timestamps)] < self.scanned_to:
+                fp.seek(self.checkpoints[len(self.timestamps)])
+                head = fp.readline(128).decode("utf-8", errors="replace")
+                self.timestamps.append(line_timestamp(head).strip())
+            position = bisect.bisect_left(self.timestamps, timestamp)
+            return self.checkpoints[max(position - 1, 0)]
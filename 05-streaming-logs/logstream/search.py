@@ -0,0 +1,27 @@
+from typing import Iterable, Iterator, Tuple
+
+from logstream.filters import LineFilter, line_timestamp
+
+
+def search(logs: Iterable[Tuple[str, object]], line_filter: LineFilter, limit: int = 1000) -> Iterator[dict]:
+    """
+    Matching lines from each (deployment_id, log), streamed as they are found.
+
+    Logs are read forward a block at a time, never loaded whole. With a
+    `since` bound the read starts where the log's time index points (a
+    segment from the manifest, then a checkpoint inside it), and with an
+    `until` bound it stops at the first later line, so a narrow time range
+    costs about its own size whatever the size of the log.
+    """
+    found = 0
+    for deployment_id, log in logs:
+        start = log.offset_at_time(line_filter.since) if line_filter.since else 0
+        for line in log.read_lines(start):
+            if line_filter.until is not None and line_timestamp(line.text) > line_filter.until:
+                break
+            if not line_filter.matches(line.text):
+                continue
+            yield {"deployment_id": deployment_id, "offset": line.offset, "line": line.text}
+            found += 1
+            if found >= limit:
+                return
@@ -0,0 +1,362 @@
+import bisect
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from logstream.fanout import LogLine
+from logstream.filters import line_timestamp
+from logstream.offset_index import OffsetIndex
+from logstream.tail_reader import read_lines, tail_lines
+
+try:
+    import zstandard
+except ImportError:  # optional, gzip is always available
+    zstandard = None
+
+MANIFEST = "manifest.json"
+GZIP = "gzip"
+ZSTD = "zstd"
+EXTENSIONS = {GZIP: ".gz", ZSTD: ".zst"}
+DEFAULT_COMPRESSION = ZSTD if zstandard is not None else GZIP
+
+
+def segment_name(base: int) -> str:
+    """Segments are named after their first offset, so names sort in log order"""
+    return f"{base:020d}.log"
+
+
+def open_segment(path: str):
+    """Binary reader for a segment, decompressing sealed ones on the fly"""
+    if path.endswith(EXTENSIONS[GZIP]):
+        return gzip.open(path, "rb")
+    if path.endswith(EXTENSIONS[ZSTD]):
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed, pip install zstandard to read it")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+
+def compress_file(path: str, compression: str) -> str:
+    """Compress `path` next to itself, remove the original, return the new path"""
+    target = path + EXTENSIONS[compression]
+    with open(path, "rb") as source:
+        if compression == ZSTD:
+            with open(target + ".tmp", "wb") as raw:
+                zstandard.ZstdCompressor(level=3).copy_stream(source, raw)
+        else:
+            with gzip.open(target + ".tmp", "wb", compresslevel=6) as out:
+                while chunk := source.read(1 << 20):
+                    out.write(chunk)
+    os.replace(target + ".tmp", target)
+    os.remove(path)
+    return target
+
+
+def read_manifest(directory: str) -> dict:
+    with open(os.path.join(directory, MANIFEST), encoding="utf-8") as fp:
+        return json.load(fp)
+
+
+def write_manifest(directory: str, manifest: dict):
+    """Write-then-rename, readers never see a half-written manifest"""
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as fp:
+        json.dump(manifest, fp)
+    os.replace(path + ".tmp", path)
+
+
+class SegmentWriter:
+    """
+    Appends a deployment's log to size- or time-rotated segment files.
+
+    The newest segment is a plain file that readers tail. When it reaches
+    `max_bytes` or `max_age` seconds it is sealed: a new segment starts and
+    the old one is compressed in the background. The manifest records, per
+    segment, its offsets, line count and first/last timestamps, so readers
+    find any offset, line or time without opening the segments.
+
+    Offsets are logical: a segment starting at offset `base` holds bytes
+    base..base + size of the log as if it were one uncompressed file.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 4 << 20, max_age: float = 3600,
+                 compression: str = DEFAULT_COMPRESSION, manifest_interval: float = 5.0):
+        if compression not in EXTENSIONS:
+            raise ValueError(f"unknown compression {compression!r}, expected one of {tuple(EXTENSIONS)}")
+        if compression == ZSTD and zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compression = compression
+        self.manifest_interval = manifest_interval
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        try:
+            self.manifest = read_manifest(directory)
+        except FileNotFoundError:
+            self.manifest = {"segments": []}
+        self.fp = None
+        self.opened_at = 0.0
+        self.saved_at = 0.0
+        self._open(self.manifest["segments"][-1]["base"] + self.manifest["segments"][-1]["size"]
+                   if self.manifest["segments"] else 0)
+
+    @property
+    def active(self) -> dict:
+        return self.manifest["segments"][-1]
+
+    def _open(self, base: int):
+        segments = self.manifest["segments"]
+        if segments and not segments[-1]["sealed"]:
+            # Reopened after a restart: keep appending to the unsealed segment, whose
+            # stats in the manifest may be up to `manifest_interval` behind the file
+            path = os.path.join(self.directory, segments[-1]["name"])
+            lines = tail_lines(path, 1)
+            segments[-1]["size"] = lines[-1].offset if lines else 0
+            segments[-1]["lines"] = sum(1 for _ in read_lines(path, 0, segments[-1]["size"]))
+            first = next(read_lines(path, 0), None)
+            segments[-1]["first_ts"] = line_timestamp(first.text) if first else None
+            segments[-1]["last_ts"] = line_timestamp(lines[-1].text) if lines else None
+        else:
+            segments.append({"name": segment_name(base), "base": base, "size": 0, "lines": 0,
+                             "first_ts": None, "last_ts": None, "sealed": False})
+        self.fp = open(os.path.join(self.directory, self.active["name"]), "ab")
+        self.opened_at = time.time()
+        write_manifest(self.directory, self.manifest)
+        self.saved_at = time.time()
+
+    def write(self, line: str):
+        data = f"{line}\n".encode("utf-8")
+        with self.lock:
+            if self.active["size"] and (self.active["size"] + len(data) > self.max_bytes
+                                        or time.time() - self.opened_at > self.max_age):
+                self._rotate()
+            self.fp.write(data)
+            self.fp.flush()
+            segment = self.active
+            segment["size"] += len(data)
+            segment["lines"] += 1
+            timestamp = line_timestamp(line)
+            segment["first_ts"] = segment["first_ts"] or timestamp
+            segment["last_ts"] = timestamp
+            if time.time() - self.saved_at > self.manifest_interval:
+                write_manifest(self.directory, self.manifest)
+                self.saved_at = time.time()
+
+    def _rotate(self):
+        self._seal()
+        self._open(self.active["base"] + self.active["size"])
+
+    def _seal(self):
+        self.fp.close()
+        segment = self.active
+        segment["sealed"] = True
+        write_manifest(self.directory, self.manifest)
+        threading.Thread(target=self._compress, args=(segment,), daemon=True).start()
+
+    def _compress(self, segment: dict):
+        compressed = compress_file(os.path.join(self.directory, segment["name"]), self.compression)
+        with self.lock:
+            segment["name"] = os.path.basename(compressed)
+            segment["stored"] = os.path.getsize(compressed)
+            write_manifest(self.directory, self.manifest)
+
+    def close(self):
+        """Seal the last segment, the deployment is done"""
+        with self.lock:
+            if not self.fp.closed:
+                self._seal()
+
+
+class SegmentedLog:
+    """
+    Read side of a segmented log, driven by its manifest.
+
+    The manifest is re-read only when its mtime changes. Sealed segments are
+    streamed through the decompressor; the active one is a plain file read
+    with the same block readers as a single-file log.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.key = directory
+        self.watch_path = directory  # inotify on the directory sees writes and new segments
+        self.lock = threading.Lock()
+        self.manifest_mtime = None
+        self.segments: List[dict] = []
+        self.indexes: Dict[str, OffsetIndex] = {}  # per plain (active) segment
+
+    def _segments(self) -> List[dict]:
+        try:
+            mtime = os.stat(os.path.join(self.directory, MANIFEST)).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        with self.lock:
+            if mtime != self.manifest_mtime:
+                self.segments = read_manifest(self.directory)["segments"]
+                self.manifest_mtime = mtime
+            return self.segments
+
+    def _path(self, segment: dict) -> str:
+        path = os.path.join(self.directory, segment["name"])
+        if not os.path.exists(path) and not segment["name"].endswith(tuple(EXTENSIONS.values())):
+            # Compressed since the manifest was read
+            for extension in EXTENSIONS.values():
+                if os.path.exists(path + extension):
+                    return path + extension
+        return path
+
+    def _plain(self, segment: dict) -> bool:
+        return not self._path(segment).endswith(tuple(EXTENSIONS.values()))
+
+    def _index(self, segment: dict) -> OffsetIndex:
+        path = self._path(segment)
+        if path not in self.indexes:
+            self.indexes[path] = OffsetIndex(path)
+        return self.indexes[path]
+
+    def _segment_for(self, offset: int) -> Optional[Tuple[int, dict]]:
+        segments = self._segments()
+        position = bisect.bisect_right([segment["base"] for segment in segments], offset) - 1
+        if position < 0:
+            return None
+        return position, segments[position]
+
+    def _segment_lines(self, segment: dict, start: int = 0, end: Optional[int] = None) -> Iterator[LogLine]:
+        """Lines of one segment from local offset `start`, offsets made logical"""
+        base = segment["base"]
+        if self._plain(segment):
+            for line in read_lines(self._path(segment), start, end):
+                yield LogLine(base + line.offset, line.text)
+            return
+        with open_segment(self._path(segment)) as fp:
+            # Compressed streams only seek forward by reading, so split every block
+            offset = 0
+            partial = b""
+            while chunk := fp.read(1 << 16):
+                lines = (partial + chunk).split(b"\n")
+                partial = lines.pop()
+                for line in lines:
+                    offset += len(line) + 1
+                    if end is not None and offset > end:
+                        return
+                    if offset > start:
+                        yield LogLine(base + offset, line.decode("utf-8", errors="replace").strip())
+
+    # --- the interface shared with FileLog --------------------------------
+
+    def exists(self) -> bool:
+        return bool(self._segments())
+
+    def end(self) -> int:
+        """Logical size: everything written so far"""
+        segments = self._segments()
+        if not segments:
+            return 0
+        last = segments[-1]
+        if self._plain(last):
+            return last["base"] + os.path.getsize(self._path(last))
+        return last["base"] + last["size"]
+
+    def segment_at(self, position: int) -> Tuple[str, int]:
+        """(plain file, base) to tail from `position`, which is in the active segment"""
+        found = self._segment_for(position)
+        if found is None:
+            return os.path.join(self.directory, segment_name(0)), 0
+        return self._path(found[1]), found[1]["base"]
+
+    def next_segment(self, base: int) -> Optional[Tuple[str, int]]:
+        """The segment after the one starting at `base`, once the writer has rotated"""
+        segments = self._segments()
+        for segment, following in zip(segments, segments[1:]):
+            if segment["base"] == base:
+                return self._path(following), following["base"]
+        return None
+
+    def read_lines(self, start: int, end: Optional[int] = None) -> Iterator[LogLine]:
+        found = self._segment_for(start)
+        if found is None:
+            return
+        position, _ = found
+        for segment in self._segments()[position:]:
+            if end is not None and segment["base"] >= end:
+                return
+            local_end = end - segment["base"] if end is not None else None
+            yield from self._segment_lines(segment, max(start - segment["base"], 0), local_end)
+
+    def tail_lines(self, n: int, end: Optional[int] = None) -> List[LogLine]:
+        end = self.end() if end is None else end
+        lines: List[LogLine] = []
+        for segment in reversed(self._segments()):
+            if segment["base"] >= end or len(lines) >= n:
+                continue
+            local_end = end - segment["base"]
+            if self._plain(segment):
+                found = [LogLine(segment["base"] + line.offset, line.text)
+                         for line in tail_lines(self._path(segment), n - len(lines), end=local_end)]
+            else:
+                # A sealed segment is bounded by max_bytes, stream it and keep the last lines
+                found = list(self._segment_lines(segment, 0, local_end))[-(n - len(lines)):]
+            lines = found + lines
+        return lines
+
+    def line_start(self, offset: int) -> Optional[int]:
+        found = self._segment_for(offset)
+        if found is None or offset > self.end():
+            return None
+        _, segment = found
+        if offset == segment["base"]:
+            return offset
+        if self._plain(segment):
+            local = self._index(segment).line_start(offset - segment["base"])
+            return segment["base"] + local if local is not None else None
+        for line in self._segment_lines(segment):
+            if line.offset >= offset:
+                return line.offset
+        return segment["base"] + segment["size"]
+
+    def offset_of_line(self, line_no: int) -> Optional[int]:
+        for segment in self._segments():
+            # A sealed segment can still be plain while it is being compressed, its line count is final
+            if not segment["sealed"]:
+                local = self._index(segment).offset_of_line(line_no)
+                return segment["base"] + local if local is not None else None
+            if line_no < segment["lines"]:
+                return self._nth_start(segment, line_no)
+            line_no -= segment["lines"]
+        return self.end() if line_no == 0 else None
+
+    def _nth_start(self, segment: dict, line_no: int) -> int:
+        offset = segment["base"]
+        for index, line in enumerate(self._segment_lines(segment)):
+            if index == line_no:
+                break
+            offset = line.offset
+        return offset
+
+    def offset_at_time(self, timestamp: str) -> int:
+        """Skip whole segments by their time bounds, then the active one by its index"""
+        for segment in self._segments():
+            if segment["last_ts"] is not None and segment["last_ts"] < timestamp and segment["sealed"]:
+                continue
+            if self._plain(segment):
+                return segment["base"] + self._index(segment).offset_at_time(timestamp)
+            return segment["base"]
+        return self.end()
+
+    def summary(self) -> dict:
+        """What the index page shows, straight from the manifest"""
+        segments = self._segments()
+        return {
+            "deployment_id": os.path.basename(self.directory),
+            "lines": sum(segment["lines"] for segment in segments),
+            "size": sum(segment["size"] for segment in segments),
+            "bytes_on_disk": sum(segment.get("stored", segment["size"]) for segment in segments),
+            "segments": len(segments),
+            "first_ts": segments[0]["first_ts"] if segments else None,
+            "last_ts": segments[-1]["last_ts"] if segments else None,
+        }
@@ -0,0 +1,24 @@
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+THREADING = "threading"
+EVENTLET = "eventlet"
+SERVING_MODES = (THREADING, EVENTLET)
+
+
+def raise_open_files_limit(wanted: int) -> int:
+    """
+    Every open stream holds a socket, and the usual soft limit of 1024 file
+    descriptors would cap a green server far below what it can hold. Lift the
+    soft limit towards `wanted` (the hard limit still applies), return it.
+    """
+    if resource is None:
+        return wanted
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+    if target > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        return target
+    return soft
@@ -0,0 +1,119 @@
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from logstream.fanout import LogLine
+from logstream.offset_index import OffsetIndex
+from logstream.segments import SegmentedLog
+from logstream.tail_reader import read_lines, tail_lines
+
+
+class FileLog:
+    """
+    A deployment log kept as one plain `{deployment_id}.log` file, the
+    layout used before segments. Same interface as SegmentedLog, with a
+    single segment that starts at offset 0 and never rotates.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.key = path
+        self.watch_path = path
+        self.index = OffsetIndex(path)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def end(self) -> int:
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def segment_at(self, position: int) -> Tuple[str, int]:
+        return self.path, 0
+
+    def next_segment(self, base: int) -> Optional[Tuple[str, int]]:
+        return None
+
+    def read_lines(self, start: int, end: Optional[int] = None) -> Iterator[LogLine]:
+        return read_lines(self.path, start, end)
+
+    def tail_lines(self, n: int, end: Optional[int] = None) -> List[LogLine]:
+        return tail_lines(self.path, n, end=end)
+
+    def line_start(self, offset: int) -> Optional[int]:
+        return self.index.line_start(offset)
+
+    def offset_of_line(self, line_no: int) -> Optional[int]:
+        return self.index.offset_of_line(line_no)
+
+    def offset_at_time(self, timestamp: str) -> int:
+        return self.index.offset_at_time(timestamp) if self.exists() else 0
+
+    def summary(self) -> dict:
+        size = self.end()
+        return {
+            "deployment_id": os.path.basename(self.path)[:-len(".log")],
+            "lines": None,  # unknown without reading the whole file
+            "size": size,
+            "bytes_on_disk": size,
+            "segments": 1,
+            "first_ts": None,
+            "last_ts": None,
+        }
+
+
+Log = Union[FileLog, SegmentedLog]
+
+
+class LogCatalog:
+    """
+    Every deployment's log in a data directory.
+
+    New deployments are directories of segments with a manifest; old ones
+    may be a single `.log` file. The listing is cached and only rebuilt when
+    the data directory changes (a deployment was created), so a page view
+    costs one stat plus one cached manifest read per deployment.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.logs: Dict[str, Log] = {}
+        self.listing: List[str] = []
+        self.listing_mtime = None
+        self.lock = threading.Lock()
+
+    def directory_for(self, deployment_id: str) -> str:
+        """Where a new deployment writes its segments"""
+        return os.path.join(self.directory, os.path.basename(deployment_id))
+
+    def open(self, deployment_id: str) -> Log:
+        deployment_id = os.path.basename(deployment_id)
+        with self.lock:
+            log = self.logs.get(deployment_id)
+            if log is None or (isinstance(log, FileLog) and not log.exists()):
+                legacy = os.path.join(self.directory, f"{deployment_id}.log")
+                if os.path.isfile(legacy):
+                    log = FileLog(legacy)
+                else:
+                    log = SegmentedLog(self.directory_for(deployment_id))
+                self.logs[deployment_id] = log
+            return log
+
+    def deployments(self) -> List[str]:
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        with self.lock:
+            if mtime != self.listing_mtime:
+                names = []
+                for entry in os.scandir(self.directory):
+                    if entry.is_dir():
+                        names.append(entry.name)
+                    elif entry.is_file() and entry.name.endswith(".log"):
+                        names.append(entry.name[:-len(".log")])
+                self.listing = sorted(names)
+                self.listing_mtime = mtime
+            return list(self.listing)
+
+    def summaries(self) -> List[dict]:
+        return [self.open(deployment_id).summary() for deployment_id in self.deployments()]
@@ -0,0 +1,86 @@
+import os
+from typing import Iterator, List, Optional
+
+from logstream.fanout import LogLine
+
+
+def _decode(line: bytes) -> str:
+    return line.decode("utf-8", errors="replace").strip()
+
+
+def tail_lines(path: str, n: int, block_size: int = 8192, end: Optional[int] = None) -> List[LogLine]:
+    """
+    Last `n` complete lines of a file, oldest first.
+
+    Reads backwards from `end` (default: end of file) one block at a time and
+    stops as soon as it has seen `n` newlines, so the cost is proportional to
+    the size of those lines, not of the file. A trailing line without its
+    newline is still being written and is left out. Returns [] if the file
+    doesn't exist yet.
+    """
+    if n <= 0:
+        return []
+    try:
+        fp = open(path, "rb")
+    except FileNotFoundError:
+        return []
+
+    with fp:
+        position = fp.seek(0, os.SEEK_END) if end is None else end
+        blocks = []
+        newlines = 0
+        trimmed = False
+        # n lines need n + 1 newlines: the one ending the line before them too
+        while position > 0 and newlines <= n:
+            size = min(block_size, position)
+            position -= size
+            fp.seek(position)
+            block = fp.read(size)
+            if not trimmed:
+                # Drop the incomplete last line before counting anything
+                cut = block.rfind(b"\n")
+                if cut == -1 and position > 0:
+                    continue
+                block = block[:cut + 1]
+                trimmed = True
+            newlines += block.count(b"\n")
+            blocks.append(block)
+
+    data = b"".join(reversed(blocks))
+    lines = data.split(b"\n")[:-1]  # the last element is the empty tail after "\n"
+    offset = position + len(data)
+    result = []
+    for line in reversed(lines[-n:]):
+        result.append(LogLine(offset, _decode(line)))
+        offset -= len(line) + 1
+    result.reverse()
+    return result
+
+
+def read_lines(path: str, start: int, end: Optional[int] = None, block_size: int = 65536) -> Iterator[LogLine]:
+    """
+    Complete lines from byte offset `start` up to `end` (default: end of file).
+
+    `start` must be the beginning of a line, e.g. the offset of a LogLine
+    already delivered. Lines are yielded as blocks are read, so replaying a
+    long stretch of log never holds more than one block in memory.
+    """
+    try:
+        fp = open(path, "rb")
+    except FileNotFoundError:
+        return
+
+    with fp:
+        end = fp.seek(0, os.SEEK_END) if end is None else end
+        fp.seek(start)
+        offset = start
+        partial = b""
+        while offset + len(partial) < end:
+            chunk = fp.read(min(block_size, end - offset - len(partial)))
+            if not chunk:
+                break
+            lines = (partial + chunk).split(b"\n")
+            partial = lines.pop()
+            for line in lines:
+                offset += len(line) + 1
+                yield LogLine(offset, _decode(line))
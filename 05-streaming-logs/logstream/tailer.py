@@ -0,0 +1,230 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from logstream.fanout import COALESCE, LogLine, Subscription
+from logstream.segments import open_segment
+
+# inotify event masks, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_MOVE_SELF = 0x00000800
+IN_DELETE_SELF = 0x00000400
+
+
+class InotifyWatcher:
+    """Sleeps until the kernel reports a write to the file (Linux only)"""
+
+    def __init__(self, path: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # On a directory, IN_MODIFY / IN_CREATE / IN_MOVED_TO report its files
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MOVE_SELF | IN_DELETE_SELF
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {path}")
+
+    def wait(self, timeout: float) -> bool:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 4096):  # drain, one wakeup covers every queued event
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback when inotify is unavailable: just sleep a little"""
+
+    def __init__(self, path: str, interval: float = 0.1):
+        self.interval = interval
+
+    def wait(self, timeout: float) -> bool:
+        time.sleep(min(self.interval, timeout))
+        return True
+
+    def close(self):
+        pass
+
+
+def make_watcher(path: str, poll_interval: float = 0.1):
+    try:
+        return InotifyWatcher(path)
+    except (OSError, AttributeError, TypeError):
+        # Not Linux, no libc found, or out of inotify watches
+        return PollingWatcher(path, poll_interval)
+
+
+class LogTailer:
+    """
+    One reader per log file, shared by every viewer of that deployment.
+
+    A single thread sleeps on inotify (or polls as a fallback), reads new
+    lines once and pushes them into each subscriber's bounded queue. Disk
+    reads and wakeups scale with deployments, not with viewers.
+
+    Lines carry their byte offset. Tailing starts at the end of the log as
+    it is when the tailer is created, so a viewer that reads history up to
+    the log size it sees after subscribing misses nothing in between. When
+    the writer rotates to a new segment, the tailer finishes the old one and
+    carries on in the next.
+    """
+
+    def __init__(self, log, on_idle=None, poll_interval: float = 0.1, idle_timeout: float = 30):
+        self.log = log  # a FileLog or SegmentedLog from logstream.storage
+        self.path = log.key
+        self.on_idle = on_idle
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.subscribers: Set[Subscription] = set()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.idle_since: Optional[float] = None
+        self.stopped = False
+        self.position = log.end()  # 0 if not created yet: tail it from the first byte
+
+    def start(self):
+        self.thread.start()
+
+    def subscribe(self, maxsize: int, policy: str = COALESCE, label: str = "", line_filter=None) -> Subscription:
+        subscription = Subscription(maxsize, policy, label, on_close=self.unsubscribe, line_filter=line_filter)
+        with self.lock:
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def stats(self) -> List[dict]:
+        with self.lock:
+            subscribers = list(self.subscribers)
+        return [subscription.stats() for subscription in subscribers]
+
+    def _dispatch(self, line: LogLine):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        matched = {}  # each distinct filter runs once per line, however many viewers share it
+        for subscription in subscribers:
+            line_filter = subscription.line_filter
+            if line_filter is not None:
+                if line_filter not in matched:
+                    matched[line_filter] = line_filter.matches(line.text)
+                if not matched[line_filter]:
+                    continue
+            subscription.push(line)
+
+    def _should_stop(self) -> bool:
+        """True once nobody has been subscribed for `idle_timeout` seconds"""
+        with self.lock:
+            if self.subscribers:
+                self.idle_since = None
+                return False
+            if self.idle_since is None:
+                self.idle_since = time.time()
+            if time.time() - self.idle_since <= self.idle_timeout:
+                return False
+            # subscribe() checks `stopped` under this same lock
+            self.stopped = True
+        if self.on_idle is not None:
+            self.on_idle(self)
+        return True
+
+    def _consume(self, data: bytes, partial: bytes) -> bytes:
+        """Dispatch the complete lines in partial + data, return the incomplete rest"""
+        lines = (partial + data).split(b"\n")
+        partial = lines.pop()  # incomplete last line, wait for the rest
+        for line in lines:
+            self.position += len(line) + 1
+            self._dispatch(LogLine(self.position, line.decode("utf-8", errors="replace").strip()))
+        return partial
+
+    def _run(self):
+        # Wait for the deployment to create its log, once for all viewers
+        while not self.log.exists():
+            if self._should_stop():
+                return
+            time.sleep(self.poll_interval)
+
+        watcher = make_watcher(self.log.watch_path, self.poll_interval)
+        path, base = self.log.segment_at(self.position)
+        fp = open_segment(path)
+        partial = b""
+        try:
+            fp.seek(self.position - base)
+            while True:
+                chunk = fp.read(65536)
+                if chunk:
+                    partial = self._consume(chunk, partial)
+
+                if self._should_stop():
+                    return
+
+                if not chunk:
+                    following = self.log.next_segment(base)
+                    if following is None:
+                        watcher.wait(timeout=1.0)
+                        continue
+                    # Rotated: whatever was written before the switch, then the next segment
+                    partial = self._consume(fp.read(), partial)
+                    fp.close()
+                    path, base = following
+                    fp = open_segment(path)
+        finally:
+            fp.close()
+            watcher.close()
+
+
+class TailerRegistry:
+    """Hands out the single LogTailer for each log, starting it on first use"""
+
+    def __init__(self, subscriber_buffer: int = 1000, policy: str = COALESCE, poll_interval: float = 0.1):
+        self.subscriber_buffer = subscriber_buffer
+        self.policy = policy
+        self.poll_interval = poll_interval
+        self.tailers: Dict[str, LogTailer] = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, log, policy: Optional[str] = None, label: str = "", line_filter=None) -> Subscription:
+        policy = policy or self.policy
+        with self.lock:
+            tailer = self.tailers.get(log.key)
+            if tailer is not None:
+                with tailer.lock:
+                    if not tailer.stopped:
+                        subscription = Subscription(self.subscriber_buffer, policy, label,
+                                                    on_close=tailer.unsubscribe, line_filter=line_filter)
+                        tailer.subscribers.add(subscription)
+                        return subscription
+
+            tailer = LogTailer(log, on_idle=self._forget, poll_interval=self.poll_interval)
+            self.tailers[log.key] = tailer
+            subscription = tailer.subscribe(self.subscriber_buffer, policy, label, line_filter)
+            tailer.start()
+            return subscription
+
+    def stats(self) -> Dict[str, List[dict]]:
+        """Per-viewer lag for every tailed log"""
+        with self.lock:
+            tailers = dict(self.tailers)
+        return {path: tailer.stats() for path, tailer in tailers.items()}
+
+    def _forget(self, tailer: LogTailer):
+        with self.lock:
+            if self.tailers.get(tailer.path) is tailer:
+                del self.tailers[tailer.path]
@@ -1,7 +1,9 @@
 import mysql.connector
+from mysql.connector import pooling
 import threading
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple, Optional
 
 # Configure logging
@@ -15,6 +17,15 @@ DB_CONFIG = {
     'database': 'airline_booking'
 }
 
+# Bookings run on a fixed number of workers sharing a fixed number of
+# connections, however many users there are. mysql.connector's pool raises
+# instead of waiting when it is empty, so there is one connection per worker.
+POOL_SIZE = 10
+WORKERS = POOL_SIZE
+
+_pool = None
+_pool_lock = threading.Lock()
+
 class User:
     def __init__(self, id: int, name: str):
         self.id = id
@@ -28,7 +39,12 @@ class Seat:
         self.user_id = user_id
 
 def get_connection():
-    return mysql.connector.connect(**DB_CONFIG)
+    """A connection from the shared pool, close() hands it back"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(pool_name="booking", pool_size=POOL_SIZE, **DB_CONFIG)
+    return _pool.get_connection()
 
 def get_all_users() -> List[User]:
     """Get all users from database"""
@@ -100,16 +116,9 @@ def main():
     users = get_all_users()
     logging.info(f"Simulating {len(users)} users")
     
-    # Create and start threads
-    threads = []
-    for user in users:
-        thread = threading.Thread(target=book_seat_worker, args=(user,))
-        threads.append(thread)
-        thread.start()
-    
-    # Wait for all threads to complete
-    for thread in threads:
-        thread.join()
+    # A bounded pool of workers books for every user, instead of a thread per user
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        list(executor.map(book_seat_worker, users))
     
     end_time = time.time()
     execution_time = (end_time - start_time) * 1000  # Convert to milliseconds
@@ -0,0 +1,160 @@
+import mysql.connector
+from mysql.connector import pooling
+import threading
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Database configuration
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': 'your_password',
+    'database': 'airline_booking'
+}
+
+# Bookings run on a fixed number of workers sharing a fixed number of
+# connections, however many users there are. mysql.connector's pool raises
+# instead of waiting when it is empty, so there is one connection per worker.
+POOL_SIZE = 10
+WORKERS = POOL_SIZE
+
+# Optimistic booking: no row is locked up front, a conditional UPDATE claims
+# the seat and a conflicting user retries on another candidate after a backoff
+CANDIDATES = 10  # free seats read per attempt, spreads users over different rows
+MAX_ATTEMPTS = 10
+BACKOFF_BASE = 0.001  # seconds, doubled per conflict...
+BACKOFF_CAP = 0.05  # ...up to this, then a random sleep below it (full jitter)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+class User:
+    def __init__(self, id: int, name: str):
+        self.id = id
+        self.name = name
+
+class Seat:
+    def __init__(self, id: int, name: str, trip_id: int, user_id: Optional[int]):
+        self.id = id
+        self.name = name
+        self.trip_id = trip_id
+        self.user_id = user_id
+
+def get_connection():
+    """A connection from the shared pool, close() hands it back"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(pool_name="booking", pool_size=POOL_SIZE, **DB_CONFIG)
+    return _pool.get_connection()
+
+def get_all_users() -> List[User]:
+    """Get all users from database"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id, name FROM users")
+        users = [User(row[0], row[1]) for row in cursor.fetchall()]
+        return users
+    finally:
+        cursor.close()
+        conn.close()
+
+def book(user: User) -> Tuple[Optional[Seat], Optional[str]]:
+    """Book a seat for the user with a conditional UPDATE, retrying on conflict"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        for attempt in range(MAX_ATTEMPTS):
+            # Read a few free seats without locking anything
+            cursor.execute("""
+                SELECT id, name, trip_id, user_id FROM seats 
+                WHERE trip_id = 1 AND user_id IS NULL 
+                ORDER BY id LIMIT %s
+            """, (CANDIDATES,))
+            rows = cursor.fetchall()
+            if not rows:
+                conn.rollback()
+                return None, "No available seats"
+            
+            # First try the candidate the user hashes to, then random ones
+            if attempt == 0:
+                row = rows[user.id % len(rows)]
+            else:
+                row = random.choice(rows)
+            seat = Seat(row[0], row[1], row[2], row[3])
+            
+            # Claim it only if it is still free
+            cursor.execute("""
+                UPDATE seats SET user_id = %s WHERE id = %s AND user_id IS NULL
+            """, (user.id, seat.id))
+            claimed = cursor.rowcount == 1
+            
+            # Commit either way, the next attempt needs a fresh snapshot
+            conn.commit()
+            if claimed:
+                return seat, None
+            
+            # Someone else got it first, back off before trying another seat
+            time.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+        
+        return None, f"Gave up after {MAX_ATTEMPTS} conflicting attempts"
+        
+    except Exception as e:
+        conn.rollback()
+        return None, str(e)
+    finally:
+        cursor.close()
+        conn.close()
+
+def book_seat_worker(user: User):
+    """Worker function for each thread"""
+    seat, error = book(user)
+    
+    if error:
+        logging.error(f"We could not assign the seat to {user.name}: {error}")
+    else:
+        logging.info(f"{user.name} was assigned the seat {seat.name}")
+
+def main():
+    start_time = time.time()
+    logging.info("Starting seat booking simulation with optimistic conditional updates")
+    
+    # Get all users
+    users = get_all_users()
+    logging.info(f"Simulating {len(users)} users")
+    
+    # A bounded pool of workers books for every user, instead of a thread per user
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        list(executor.map(book_seat_worker, users))
+    
+    end_time = time.time()
+    execution_time = (end_time - start_time) * 1000  # Convert to milliseconds
+    
+    # Check final seat allocation
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM seats WHERE user_id IS NOT NULL")
+        allocated_seats = cursor.fetchone()[0]
+        logging.info(f"Total seats allocated: {allocated_seats}")
+        
+        cursor.execute("SELECT id, name, user_id FROM seats WHERE user_id IS NOT NULL ORDER BY id")
+        for row in cursor.fetchall():
+            logging.info(f"Seat {row[1]} (ID: {row[0]}) allocated to user {row[2]}")
+            
+    finally:
+        cursor.close()
+        conn.close()
+    
+    logging.info(f"Execution took {execution_time:.2f}ms")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
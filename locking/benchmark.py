@@ -0,0 +1,243 @@
+"""
+Seat booking benchmark: plain, FOR UPDATE, SKIP LOCKED, optimistic, book_many, inventory
+=======================================================================================
+Seeds `users` and `trips` of `seats` each, then lets every user try to book a seat with each
+strategy at each concurrency level (the number of booking threads). The
+threads share one connection pool, sized separately with --pool-size.
+`book_many` seats --batch-size users per transaction, like a flash-sale burst.
+`inventory` allocates from SeatInventory's in-memory free lists and writes the
+seats behind. Its correctness is checked once everything has been written.
+Users are spread over the trips by id. Each trip's seats are split into
+--segments segments, and a booking starts scanning at the segment its user's
+id hashes to instead of at the lowest free seat.
+
+Reports per run:
+- bookings/sec and book() latency percentiles
+- lock wait: time transactions spent blocked on row locks
+- retries: optimistic attempts that lost their seat to another user
+- collisions: rows (or inventory stripes) a booking found locked or lost to
+  another user, in total and per trip and segment
+- correctness: seats filled vs expected, and double bookings (users told they
+  got a seat that ended up assigned to someone else)
+
+Usage:
+    python benchmark.py                                  # embedded backend, no server needed
+    python benchmark.py --users 1000 --seats 200 --concurrency 1,16,64,256
+    python benchmark.py --users 10000 --seats 2000 --concurrency 64 --pool-size 4,16,64
+    python benchmark.py --users 3000 --seats 500 --trips 4 --segments 1,8 --strategies skip_locked,optimistic
+    python benchmark.py --backend mysql --mysql-password secret
+"""
+
+import argparse
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import booking
+from inventory import SeatInventory
+
+BOOK_MANY = "book_many"
+INVENTORY = "inventory"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Call(NamedTuple):
+    """One book(), book_many() or allocate() call as the benchmark saw it"""
+    trip_id: int
+    segment: int
+    seats: List[Tuple[booking.User, Optional[booking.Seat]]]
+    error: Optional[str]
+    lock_wait: float
+    retries: int
+    collisions: int
+
+
+def trip_of(user: booking.User, num_trips: int) -> int:
+    return user.id % num_trips + 1
+
+
+def run(backend, strategy: str, concurrency: int, num_seats: int, batch_size: int = 1, num_trips: int = 1) -> dict:
+    """Every user books once on its trip, on `concurrency` threads sharing the backend's connection pool"""
+    backend.reset()
+    users = backend.get_all_users()
+    latencies = []
+    inventory = SeatInventory(backend) if strategy == INVENTORY else None
+
+    def timed_book(user):
+        trip_id = trip_of(user, num_trips)
+        started = time.perf_counter()
+        if inventory is not None:
+            result = inventory.allocate(user, trip_id)
+        else:
+            result = backend.book(user, strategy, trip_id)
+        latencies.append(time.perf_counter() - started)
+        return Call(trip_id, result.segment, [(user, result.seat)], result.error, result.lock_wait,
+                    result.attempts - 1, result.collisions)
+
+    def timed_book_many(group):
+        trip_id = trip_of(group[0], num_trips)
+        started = time.perf_counter()
+        result = backend.book_many(group, trip_id)
+        latencies.append(time.perf_counter() - started)
+        return Call(trip_id, result.segment, list(zip(group, result.seats)), result.error, result.lock_wait,
+                    0, result.collisions)
+
+    by_trip: Dict[int, List[booking.User]] = defaultdict(list)
+    for user in users:
+        by_trip[trip_of(user, num_trips)].append(user)
+    if strategy == BOOK_MANY:
+        calls = [trip_users[i:i + batch_size] for trip_users in by_trip.values()
+                 for i in range(0, len(trip_users), batch_size)]
+        book = timed_book_many
+    else:
+        calls = users
+        book = timed_book
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(book, calls))
+    elapsed = time.perf_counter() - started
+    if inventory is not None:
+        inventory.close()
+
+    owners = {seat_id: user_id for seat_id, _, user_id in backend.allocations()}
+    booked = [(user, seat) for call in results for user, seat in call.seats if seat is not None]
+    double_booked = sum(1 for user, seat in booked if owners.get(seat.id) != user.id)
+    errors = sum(1 for call in results if call.error and call.error != "No available seats")
+    lock_waits = [call.lock_wait for call in results]
+
+    # Contention per trip and per segment (summed over trips), by where each call started.
+    # The inventory ignores the seat segments, it starts at one of its own lock stripes.
+    trips: Dict[int, dict] = defaultdict(lambda: {"booked": 0, "collisions": 0, "lock_wait": 0.0})
+    segments: Dict[int, dict] = defaultdict(lambda: {"booked": 0, "collisions": 0, "lock_wait": 0.0})
+    for call in results:
+        for stats in (trips[call.trip_id], segments[call.segment]):
+            stats["booked"] += sum(1 for _, seat in call.seats if seat is not None)
+            stats["collisions"] += call.collisions
+            stats["lock_wait"] += call.lock_wait
+
+    return {
+        "strategy": strategy,
+        "concurrency": concurrency,
+        "pool_size": backend.pool.size,
+        "segments": backend.segments_of(booking.TRIP_ID),
+        "booked": len(booked),
+        "filled": len(owners),
+        "expected": sum(min(len(trip_users), num_seats) for trip_users in by_trip.values()),
+        "double_booked": double_booked,
+        "errors": errors,
+        "retries": sum(call.retries for call in results),
+        "collisions": sum(call.collisions for call in results),
+        "bookings_per_sec": len(booked) / elapsed if elapsed else 0.0,
+        "elapsed": elapsed,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p99": percentile(latencies, 99),
+        "lock_wait_total": sum(lock_waits),
+        "lock_wait_p99": percentile(lock_waits, 99),
+        "by_trip": dict(trips),
+        "by_segment": dict(segments),
+        "partition": "stripe" if inventory is not None else "segment",
+        "partitions": inventory.stripe_count if inventory is not None else backend.segments_of(booking.TRIP_ID),
+    }
+
+
+def print_report(results: List[dict]):
+    print(f"\n{'strategy':>11} | {'threads':>7} | {'conns':>5} | {'segs':>4} | {'filled':>11} | {'double':>6} | "
+          f"{'errors':>6} | {'retries':>7} | {'collide':>7} | {'book/s':>8} | {'lat p50':>8} | {'lat p99':>8} | "
+          f"{'wait sum':>8} | {'wait p99':>8} | {'elapsed':>8}")
+    print("-" * 156)
+    for r in results:
+        filled = f"{r['filled']}/{r['expected']}"
+        print(f"{r['strategy']:>11} | {r['concurrency']:7d} | {r['pool_size']:5d} | {r['segments']:4d} | "
+              f"{filled:>11} | {r['double_booked']:6d} | {r['errors']:6d} | {r['retries']:7d} | "
+              f"{r['collisions']:7d} | {r['bookings_per_sec']:8.1f} | "
+              f"{r['latency_p50'] * 1000:6.1f}ms | {r['latency_p99'] * 1000:6.1f}ms | "
+              f"{r['lock_wait_total']:7.2f}s | {r['lock_wait_p99'] * 1000:6.1f}ms | {r['elapsed'] * 1000:6.0f}ms")
+
+
+def print_contention(results: List[dict]):
+    """Per run: booked seats, collisions and lock wait per trip, then per segment (inventory: per stripe)"""
+    for r in results:
+        print(f"\n{r['strategy']}, {r['concurrency']} threads, {r['pool_size']} connections, "
+              f"{r['partitions']} {r['partition']}s")
+        for label, groups in (("trip", r["by_trip"]), (r["partition"], r["by_segment"])):
+            for key in sorted(groups):
+                stats = groups[key]
+                print(f"  {label:>7} {key:<4} | booked {stats['booked']:6d} | collisions {stats['collisions']:7d} | "
+                      f"wait {stats['lock_wait']:7.2f}s")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare seat locking strategies under concurrency")
+    parser.add_argument("--backend", choices=sorted(booking.BACKENDS), default=booking.EmbeddedBackend.name)
+    parser.add_argument("--strategies", default=",".join(booking.STRATEGIES + (BOOK_MANY, INVENTORY)))
+    parser.add_argument("--batch-size", type=int, default=10, help="users per book_many() call")
+    parser.add_argument("--concurrency", default="1,8,32,120", help="booking threads, one run per value")
+    parser.add_argument("--pool-size", default=str(booking.POOL_SIZE),
+                        help="connections shared by the booking threads, one run per value")
+    parser.add_argument("--users", type=int, default=120)
+    parser.add_argument("--seats", type=int, default=8, help="seats per trip")
+    parser.add_argument("--trips", type=int, default=1, help="users are spread over the trips by id")
+    parser.add_argument("--segments", default="1", help="seat segments per trip, one run per value")
+    parser.add_argument("--db-path", default="booking_bench.db", help="embedded backend's sqlite file")
+    parser.add_argument("--lock-timeout", type=float, default=booking.LOCK_WAIT_TIMEOUT,
+                        help="embedded backend's lock wait timeout")
+    parser.add_argument("--mysql-host", default=booking.DB_CONFIG["host"])
+    parser.add_argument("--mysql-user", default=booking.DB_CONFIG["user"])
+    parser.add_argument("--mysql-password", default=booking.DB_CONFIG["password"])
+    parser.add_argument("--mysql-database", default=booking.DB_CONFIG["database"])
+    return parser.parse_args()
+
+
+def make_backend(args, pool_size: int):
+    if args.backend == booking.MySQLBackend.name:
+        return booking.MySQLBackend({
+            "host": args.mysql_host,
+            "user": args.mysql_user,
+            "password": args.mysql_password,
+            "database": args.mysql_database,
+        }, pool_size=pool_size)
+    return booking.EmbeddedBackend(args.db_path, lock_timeout=args.lock_timeout, pool_size=pool_size)
+
+
+def main():
+    args = parse_args()
+    strategies = args.strategies.split(",")
+    for strategy in strategies:
+        if strategy not in (BOOK_MANY, INVENTORY):
+            booking.check_strategy(strategy)
+    concurrency_levels = [int(value) for value in args.concurrency.split(",")]
+    pool_sizes = [int(value) for value in args.pool_size.split(",")]
+    segment_counts = [int(value) for value in args.segments.split(",")]
+
+    print(f"{args.users} users, {args.trips} trips of {args.seats} seats on the {args.backend} backend")
+    results = []
+    for pool_size in pool_sizes:
+        backend = make_backend(args, pool_size)
+        try:
+            for segments in segment_counts:
+                backend.seed(args.users, args.seats, args.trips, segments)
+                for strategy in strategies:
+                    for concurrency in concurrency_levels:
+                        print(f"Running {strategy} with {concurrency} threads, {pool_size} connections "
+                              f"and {segments} segments...")
+                        results.append(run(backend, strategy, concurrency, args.seats, args.batch_size, args.trips))
+        finally:
+            backend.close()
+            if isinstance(backend, booking.EmbeddedBackend):
+                backend.remove()
+    print_report(results)
+    if args.trips > 1 or any(segments > 1 for segments in segment_counts):
+        print_contention(results)
+
+
+if __name__ == "__main__":
+    main()
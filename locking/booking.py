@@ -0,0 +1,818 @@
+"""
+Shared seat booking for the three locking approaches.
+
+approach1-3/code.py differ only in how the "first free seat" SELECT locks:
+
+    plain        SELECT ... ORDER BY id LIMIT 1
+    for_update   SELECT ... ORDER BY id LIMIT 1 FOR UPDATE
+    skip_locked  SELECT ... ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED
+
+approach4 locks nothing up front:
+
+    optimistic   UPDATE ... WHERE id = ? AND user_id IS NULL, retried on conflict
+
+Seats belong to trips, and each trip's seats are split into segments, ranges
+of consecutive ids. A user starts in the segment its id hashes to and moves on
+to the next only when that one is full, so concurrent users mostly scan and
+lock different rows instead of all fighting over the lowest free id.
+
+This module runs any of them against a pluggable backend:
+
+- MySQLBackend: the real thing, needs a server and mysql-connector-python
+- EmbeddedBackend: sqlite for storage plus a row lock manager that behaves
+  like InnoDB at REPEATABLE READ, so the approaches can be compared on any box
+"""
+
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+try:
+    import mysql.connector
+except ImportError:  # optional, the embedded backend works without it
+    mysql = None
+
+PLAIN = "plain"
+FOR_UPDATE = "for_update"
+SKIP_LOCKED = "skip_locked"
+OPTIMISTIC = "optimistic"
+STRATEGIES = (PLAIN, FOR_UPDATE, SKIP_LOCKED, OPTIMISTIC)
+
+# What each strategy appends to the SELECT, the only difference between the approaches
+LOCK_CLAUSES = {
+    PLAIN: "",
+    FOR_UPDATE: " FOR UPDATE",
+    SKIP_LOCKED: " FOR UPDATE SKIP LOCKED",
+    OPTIMISTIC: "",
+}
+
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': 'your_password',
+    'database': 'airline_booking'
+}
+
+TRIP_ID = 1
+SEATS_PER_ROW = 6
+LOCK_WAIT_TIMEOUT = 50  # seconds, InnoDB's innodb_lock_wait_timeout default
+POOL_SIZE = 10  # connections per backend, shared by however many booking threads there are
+SCAN_PAGE = 64  # free rows the embedded backend reads at a time during a locking scan
+CANDIDATES = 10  # free seats an optimistic attempt picks from
+MAX_ATTEMPTS = 10  # optimistic attempts before giving up
+BACKOFF_BASE = 0.001  # seconds after the first conflict, doubled per conflict...
+BACKOFF_CAP = 0.05  # ...up to this
+
+
+class User:
+    def __init__(self, id: int, name: str):
+        self.id = id
+        self.name = name
+
+
+class Seat:
+    def __init__(self, id: int, name: str, trip_id: int, user_id: Optional[int]):
+        self.id = id
+        self.name = name
+        self.trip_id = trip_id
+        self.user_id = user_id
+
+
+class Booking(NamedTuple):
+    seat: Optional[Seat]
+    error: Optional[str]
+    lock_wait: float  # seconds this booking spent blocked on row locks
+    attempts: int = 1  # optimistic bookings retry after losing a seat to someone else
+    collisions: int = 0  # rows found locked or lost to another user, see the backends
+    segment: int = 0  # the segment the booking started in
+
+
+class GroupBooking(NamedTuple):
+    """book_many()'s result, seats[i] is users[i]'s seat or None once the trip is full"""
+    seats: List[Optional[Seat]]
+    error: Optional[str]
+    lock_wait: float
+    collisions: int = 0
+    segment: int = 0
+
+    @property
+    def filled(self) -> int:
+        return sum(1 for seat in self.seats if seat is not None)
+
+
+def seat_names(count: int) -> List[str]:
+    """1-A, 1-B, ... 1-F, 2-A, ..."""
+    return [f"{i // SEATS_PER_ROW + 1}-{chr(ord('A') + i % SEATS_PER_ROW)}" for i in range(count)]
+
+
+def trip_name(trip_id: int) -> str:
+    return f"AIRINDIA-{100 + trip_id}"
+
+
+def seat_rows(num_trips: int, seats_per_trip: int, segments: int) -> List[Tuple[int, str, int, int]]:
+    """(id, name, trip_id, segment) for every seat, each segment a range of consecutive ids"""
+    rows = []
+    for trip_id in range(1, num_trips + 1):
+        for i, name in enumerate(seat_names(seats_per_trip)):
+            rows.append((len(rows) + 1, name, trip_id, i * segments // seats_per_trip))
+    return rows
+
+
+def user_segment(user_id: int, segments: int) -> int:
+    """
+    Multiplicative (Fibonacci) hash, so users with neighbouring ids start far
+    apart. It keeps the high bits of the product: the low ones just repeat
+    user_id % segments, which lines up with trips assigned by id.
+    """
+    return ((user_id * 2654435761) & 0xFFFFFFFF) * segments >> 32
+
+
+def segment_order(start: int, segments: int) -> List[int]:
+    """Segments to try, from the starting one round to the one before it"""
+    return [(start + i) % segments for i in range(segments)]
+
+
+def pick_candidate(rows: list, user: User, attempt: int):
+    """The first attempt takes the row the user hashes to, retries a random one"""
+    if attempt == 0:
+        return rows[user.id % len(rows)]
+    return random.choice(rows)
+
+
+def backoff(attempt: int):
+    """Sleep after a lost conflict: exponential, with full jitter so retries spread out"""
+    time.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+
+
+def check_strategy(strategy: str):
+    if strategy not in STRATEGIES:
+        raise ValueError(f"strategy must be one of {STRATEGIES}")
+
+
+class ConnectionPool:
+    """
+    A fixed set of connections shared by the booking threads.
+
+    Connections are opened on first use, up to `size`. When all of them are
+    out, callers wait for one to come back rather than opening another, so the
+    number of concurrent transactions is capped by the pool, not by the
+    number of threads.
+    """
+
+    def __init__(self, connect, size: int = POOL_SIZE):
+        self.connect = connect
+        self.size = size
+        self.pool = queue.Queue(maxsize=size)
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def get_connection(self):
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            open_new = self._opened < self.size
+            if open_new:
+                self._opened += 1
+        if open_new:
+            try:
+                return self.connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        return self.pool.get()
+
+    def release_connection(self, conn):
+        # End whatever the borrower left open, a stale snapshot would leak into the next transaction
+        conn.rollback()
+        self.pool.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.get_connection()
+        try:
+            yield conn
+        finally:
+            self.release_connection(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self.pool.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+class LockWaitTimeout(Exception):
+    def __init__(self):
+        super().__init__("Lock wait timeout exceeded; try restarting transaction")
+
+
+class _RowLock:
+    def __init__(self, mutex: threading.Lock):
+        self.owner = None
+        self.waiters = 0
+        self.released = threading.Condition(mutex)
+
+
+class LockManager:
+    """
+    Exclusive row locks held until commit or rollback, like InnoDB record locks.
+
+    Each row has its own condition, so a commit only wakes the transactions
+    queued on the rows it held instead of every blocked thread.
+    """
+
+    def __init__(self, timeout: float = LOCK_WAIT_TIMEOUT):
+        self.timeout = timeout
+        self._mutex = threading.Lock()
+        self._rows: Dict[int, _RowLock] = {}
+
+    def acquire(self, row_id: int, owner, wait: bool = True) -> Tuple[bool, float]:
+        """(locked, seconds waited). With wait=False a row held by someone else is skipped."""
+        started = time.perf_counter()
+        with self._mutex:
+            row = self._rows.get(row_id)
+            if row is None:
+                row = self._rows[row_id] = _RowLock(self._mutex)
+            if row.owner is None or row.owner is owner:
+                row.owner = owner
+                return True, 0.0
+            if not wait:
+                return False, 0.0
+
+            deadline = started + self.timeout
+            row.waiters += 1
+            try:
+                while row.owner is not None:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        raise LockWaitTimeout()
+                    row.released.wait(remaining)
+                row.owner = owner
+            finally:
+                row.waiters -= 1
+        return True, time.perf_counter() - started
+
+    def release(self, row_ids, owner):
+        with self._mutex:
+            for row_id in row_ids:
+                row = self._rows.get(row_id)
+                if row is None or row.owner is not owner:
+                    continue
+                row.owner = None
+                if row.waiters:
+                    row.released.notify()
+                else:
+                    del self._rows[row_id]
+
+
+class _Transaction:
+    """
+    One booking's transaction on the embedded backend.
+
+    Reads see committed rows only. UPDATEs take the row lock and are buffered,
+    then written to sqlite in one short write transaction at commit, just
+    before the locks are released. A plain UPDATE therefore waits for the row
+    like InnoDB does and then overwrites the other writer (a lost update).
+    """
+
+    def __init__(self, conn: sqlite3.Connection, locks: LockManager, write_lock: threading.Lock):
+        self.conn = conn
+        self.locks = locks
+        self.write_lock = write_lock
+        self.held: Set[int] = set()
+        self.writes: List[Tuple[int, int]] = []
+        self.lock_wait = 0.0
+        self.collisions = 0  # rows that were locked by another transaction, waited on or skipped
+
+    def lock(self, row_id: int, wait: bool = True) -> bool:
+        locked, waited = self.locks.acquire(row_id, self, wait)
+        self.lock_wait += waited
+        if not locked or waited > 0:
+            self.collisions += 1
+        if locked:
+            self.held.add(row_id)
+        return locked
+
+    def is_free(self, seat_id: int) -> bool:
+        """The latest committed version of the row, what a locking read sees"""
+        row = self.conn.execute("SELECT user_id FROM seats WHERE id = ?", (seat_id,)).fetchone()
+        return row is not None and row[0] is None
+
+    def select_seat(self, trip_id: int, strategy: str, segments: List[int]) -> Optional[Seat]:
+        seats = self.select_seats(trip_id, strategy, 1, segments)
+        return seats[0] if seats else None
+
+    def select_seats(self, trip_id: int, strategy: str, limit: int, segments: List[int]) -> List[Seat]:
+        """Up to `limit` seats from the segments in order, each like the strategy's SELECT"""
+        seats: List[Seat] = []
+        for segment in segments:
+            seats += self._select_segment(trip_id, segment, strategy, limit - len(seats))
+            if len(seats) == limit:
+                break
+        return seats
+
+    def _select_segment(self, trip_id: int, segment: int, strategy: str, limit: int) -> List[Seat]:
+        """SELECT ... WHERE segment = ? ORDER BY id LIMIT `limit`, with the strategy's lock clause"""
+        query = ("SELECT id, name, trip_id, user_id FROM seats "
+                 "WHERE trip_id = ? AND segment = ? AND user_id IS NULL ORDER BY id")
+        if strategy == PLAIN:
+            return [Seat(*row) for row in self.conn.execute(query + " LIMIT ?", (trip_id, segment, limit))]
+
+        # A locking read walks the free rows in id order. FOR UPDATE waits on
+        # each locked row, SKIP LOCKED moves past it. Rows taken meanwhile stay
+        # locked until commit, as at REPEATABLE READ. Rows are fetched a page
+        # at a time, an open cursor would pin is_free() to its stale snapshot.
+        query = query.replace("ORDER BY", "AND id > ? ORDER BY") + " LIMIT ?"
+        seats = []
+        last_id = 0
+        while True:
+            rows = self.conn.execute(query, (trip_id, segment, last_id, max(limit, SCAN_PAGE))).fetchall()
+            if not rows:
+                return seats
+            for row in rows:
+                if not self.lock(row[0], wait=strategy == FOR_UPDATE):
+                    continue
+                if self.is_free(row[0]):
+                    seats.append(Seat(*row))
+                    if len(seats) == limit:
+                        return seats
+            last_id = rows[-1][0]
+
+    def update(self, seat_id: int, user_id: int):
+        self.lock(seat_id)
+        self.writes.append((user_id, seat_id))
+
+    def update_if_free(self, seat_id: int, user_id: int) -> bool:
+        """UPDATE ... WHERE id = ? AND user_id IS NULL, False when no row matched"""
+        self.lock(seat_id)
+        if not self.is_free(seat_id):
+            self.collisions += 1
+            return False
+        self.writes.append((user_id, seat_id))
+        return True
+
+    def commit(self):
+        try:
+            if self.writes:
+                # Queue on a mutex rather than sqlite's busy handler, which sleeps and retries
+                with self.write_lock:
+                    self.conn.execute("BEGIN IMMEDIATE")
+                    self.conn.executemany("UPDATE seats SET user_id = ? WHERE id = ?", self.writes)
+                    self.conn.execute("COMMIT")
+        finally:
+            self.rollback()
+
+    def rollback(self):
+        self.writes = []
+        self.locks.release(self.held, self)
+        self.held = set()
+
+
+class MySQLBackend:
+    """Runs the approaches' SQL against a MySQL server"""
+
+    name = "mysql"
+
+    def __init__(self, config: Optional[dict] = None, pool_size: int = POOL_SIZE):
+        if mysql is None:
+            raise RuntimeError("pip install mysql-connector-python to use the MySQL backend")
+        self.config = config or DB_CONFIG
+        self.pool = ConnectionPool(self.get_connection, pool_size)
+        self._segments: Dict[int, int] = {}
+
+    def get_connection(self):
+        return mysql.connector.connect(**self.config)
+
+    def seed(self, num_users: int, num_seats: int, num_trips: int = 1, segments: int = 1):
+        """Recreate the tables: users, trips with `num_seats` unassigned seats each, split into segments"""
+        with self.pool.connection() as conn:
+            self._seed(conn, num_users, num_seats, num_trips, segments)
+        self._segments = {}
+
+    def _seed(self, conn, num_users: int, num_seats: int, num_trips: int, segments: int):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DROP TABLE IF EXISTS seats, trips, users")
+            cursor.execute("CREATE TABLE users (id INT PRIMARY KEY, name VARCHAR(255) NOT NULL)")
+            cursor.execute("CREATE TABLE trips ("
+                           "id INT PRIMARY KEY, name VARCHAR(255) NOT NULL, segments INT NOT NULL DEFAULT 1)")
+            cursor.execute("CREATE TABLE seats ("
+                           "id INT PRIMARY KEY, name VARCHAR(16) NOT NULL, trip_id INT NOT NULL, "
+                           "segment INT NOT NULL DEFAULT 0, user_id INT NULL, "
+                           "KEY idx_seats_segment (trip_id, segment))")
+            cursor.executemany("INSERT INTO trips (id, name, segments) VALUES (%s, %s, %s)",
+                               [(i, trip_name(i), segments) for i in range(1, num_trips + 1)])
+            cursor.executemany("INSERT INTO users (id, name) VALUES (%s, %s)",
+                               [(i, f"User {i}") for i in range(1, num_users + 1)])
+            cursor.executemany("INSERT INTO seats (id, name, trip_id, segment, user_id) VALUES (%s, %s, %s, %s, NULL)",
+                               seat_rows(num_trips, num_seats, segments))
+            conn.commit()
+        finally:
+            cursor.close()
+
+    def segments_of(self, trip_id: int) -> int:
+        """How many segments the trip's seats are split into, cached"""
+        segments = self._segments.get(trip_id)
+        if segments is None:
+            rows = self._query("SELECT segments FROM trips WHERE id = %s", (trip_id,))
+            segments = self._segments[trip_id] = rows[0][0] if rows else 1
+        return segments
+
+    def trip_ids(self) -> List[int]:
+        return [row[0] for row in self._query("SELECT id FROM trips ORDER BY id")]
+
+    def reset(self):
+        self._execute("UPDATE seats SET user_id = NULL")
+
+    def get_all_users(self) -> List[User]:
+        return [User(*row) for row in self._query("SELECT id, name FROM users ORDER BY id")]
+
+    def allocations(self) -> List[Tuple[int, str, int]]:
+        """(seat id, seat name, user id) for every assigned seat"""
+        return self._query("SELECT id, name, user_id FROM seats WHERE user_id IS NOT NULL ORDER BY id")
+
+    def free_seats(self) -> List[Seat]:
+        """Every unassigned seat of every trip"""
+        return [Seat(*row) for row in self._query(
+            "SELECT id, name, trip_id, user_id FROM seats WHERE user_id IS NULL ORDER BY trip_id, id")]
+
+    def assign_seats(self, assignments: List[Tuple[int, int]]) -> int:
+        """
+        Write (seat id, user id) pairs in one transaction, only onto seats that
+        are still free. Returns how many were written.
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                written = 0
+                for seat_id, user_id in assignments:
+                    cursor.execute("UPDATE seats SET user_id = %s WHERE id = %s AND user_id IS NULL",
+                                   (user_id, seat_id))
+                    written += cursor.rowcount
+                conn.commit()
+                return written
+            finally:
+                cursor.close()
+
+    def book(self, user: User, strategy: str, trip_id: int = TRIP_ID) -> Booking:
+        """
+        approach1-3's book(), one segment at a time from the user's own.
+        MySQL doesn't report lock waits per statement, so lock_wait is the
+        time spent in the SELECTs and the UPDATE, which is where a transaction
+        blocks on a row lock. It doesn't report skipped rows either, so only
+        optimistic bookings count collisions here.
+        """
+        # Before borrowing: on a cold cache segments_of() needs a connection of its own
+        segments = self.segments_of(trip_id)
+        with self.pool.connection() as conn:
+            return self._book(conn, user, strategy, trip_id, segments)
+
+    def _book(self, conn, user: User, strategy: str, trip_id: int, segments: int) -> Booking:
+        start = user_segment(user.id, segments)
+        if strategy == OPTIMISTIC:
+            return self._book_optimistic(conn, user, trip_id, segment_order(start, segments))
+        cursor = conn.cursor()
+        lock_wait = 0.0
+        try:
+            conn.start_transaction()
+
+            row = None
+            for segment in segment_order(start, segments):
+                started = time.perf_counter()
+                cursor.execute("""
+                    SELECT id, name, trip_id, user_id FROM seats
+                    WHERE trip_id = %s AND segment = %s AND user_id IS NULL
+                    ORDER BY id LIMIT 1""" + LOCK_CLAUSES[strategy], (trip_id, segment))
+                row = cursor.fetchone()
+                lock_wait += time.perf_counter() - started
+                if row is not None:
+                    break
+            if row is None:
+                conn.rollback()
+                return Booking(None, "No available seats", lock_wait, segment=start)
+
+            seat = Seat(row[0], row[1], row[2], row[3])
+            started = time.perf_counter()
+            cursor.execute("UPDATE seats SET user_id = %s WHERE id = %s", (user.id, seat.id))
+            lock_wait += time.perf_counter() - started
+            conn.commit()
+            return Booking(seat, None, lock_wait, segment=start)
+
+        except Exception as e:
+            conn.rollback()
+            return Booking(None, str(e), lock_wait, segment=start)
+        finally:
+            cursor.close()
+
+    def _book_optimistic(self, conn, user: User, trip_id: int, segments: List[int]) -> Booking:
+        """approach4's book(), candidates come from the first segment with free seats"""
+        cursor = conn.cursor()
+        lock_wait = 0.0
+        try:
+            for attempt in range(MAX_ATTEMPTS):
+                rows = []
+                for segment in segments:
+                    cursor.execute("""
+                        SELECT id, name, trip_id, user_id FROM seats
+                        WHERE trip_id = %s AND segment = %s AND user_id IS NULL
+                        ORDER BY id LIMIT %s""", (trip_id, segment, CANDIDATES))
+                    rows = cursor.fetchall()
+                    if rows:
+                        break
+                if not rows:
+                    conn.rollback()
+                    return Booking(None, "No available seats", lock_wait, attempt + 1, attempt, segments[0])
+
+                seat = Seat(*pick_candidate(rows, user, attempt))
+                started = time.perf_counter()
+                cursor.execute("UPDATE seats SET user_id = %s WHERE id = %s AND user_id IS NULL",
+                               (user.id, seat.id))
+                lock_wait += time.perf_counter() - started
+                claimed = cursor.rowcount == 1
+                conn.commit()
+                if claimed:
+                    return Booking(seat, None, lock_wait, attempt + 1, attempt, segments[0])
+                backoff(attempt)
+
+            return Booking(None, f"Gave up after {MAX_ATTEMPTS} conflicting attempts", lock_wait,
+                           MAX_ATTEMPTS, MAX_ATTEMPTS, segments[0])
+
+        except Exception as e:
+            conn.rollback()
+            return Booking(None, str(e), lock_wait, segment=segments[0])
+        finally:
+            cursor.close()
+
+    def book_many(self, users: List[User], trip_id: int = TRIP_ID) -> GroupBooking:
+        """
+        Seat a group, or a burst of users, in one transaction: SKIP LOCKED
+        SELECTs claim up to len(users) free seats, starting in the segment the
+        first user hashes to, and one UPDATE assigns them. When fewer seats
+        are left, the first users get them and the rest None.
+        """
+        segments = self.segments_of(trip_id)  # before borrowing, see book()
+        with self.pool.connection() as conn:
+            return self._book_many(conn, users, trip_id, segments)
+
+    def _book_many(self, conn, users: List[User], trip_id: int, segments: int) -> GroupBooking:
+        start = user_segment(users[0].id, segments) if users else 0
+        cursor = conn.cursor()
+        lock_wait = 0.0
+        try:
+            conn.start_transaction()
+
+            seats: List[Seat] = []
+            for segment in segment_order(start, segments):
+                started = time.perf_counter()
+                cursor.execute("""
+                    SELECT id, name, trip_id, user_id FROM seats
+                    WHERE trip_id = %s AND segment = %s AND user_id IS NULL
+                    ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED""", (trip_id, segment, len(users) - len(seats)))
+                seats += [Seat(*row) for row in cursor.fetchall()]
+                lock_wait += time.perf_counter() - started
+                if len(seats) == len(users):
+                    break
+            if not seats:
+                conn.rollback()
+                return GroupBooking([None] * len(users), "No available seats", lock_wait, segment=start)
+
+            # UPDATE seats SET user_id = CASE id WHEN seat THEN user ... END WHERE id IN (seats)
+            assignments = []
+            for user, seat in zip(users, seats):
+                assignments += [seat.id, user.id]
+            placeholders = ", ".join(["%s"] * len(seats))
+            cursor.execute(
+                "UPDATE seats SET user_id = CASE id " + " ".join(["WHEN %s THEN %s"] * len(seats)) +
+                f" END WHERE id IN ({placeholders})",
+                assignments + [seat.id for seat in seats])
+            conn.commit()
+            return GroupBooking(seats + [None] * (len(users) - len(seats)), None, lock_wait, segment=start)
+
+        except Exception as e:
+            conn.rollback()
+            return GroupBooking([None] * len(users), str(e), lock_wait, segment=start)
+        finally:
+            cursor.close()
+
+    def close(self):
+        self.pool.close_all()
+
+    def _query(self, sql: str, params=()) -> list:
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def _execute(self, sql: str, params=()):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params)
+                conn.commit()
+            finally:
+                cursor.close()
+
+
+class EmbeddedBackend:
+    """
+    sqlite plus LockManager, a stand-in for MySQL that needs no server.
+
+    sqlite only locks whole databases, so row locks, FOR UPDATE and SKIP
+    LOCKED are emulated by LockManager and sqlite just stores committed rows
+    (in WAL mode, so readers never block the committing writer).
+    """
+
+    name = "embedded"
+
+    def __init__(self, path: str = "booking.db", lock_timeout: float = LOCK_WAIT_TIMEOUT,
+                 pool_size: int = POOL_SIZE):
+        self.path = path
+        self.locks = LockManager(lock_timeout)
+        self.write_lock = threading.Lock()
+        self.pool = ConnectionPool(self.get_connection, pool_size)
+        self._segments: Dict[int, int] = {}
+        with self.pool.connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+
+    def get_connection(self) -> sqlite3.Connection:
+        # Autocommit, _Transaction issues BEGIN/COMMIT itself
+        return sqlite3.connect(self.path, timeout=LOCK_WAIT_TIMEOUT, isolation_level=None,
+                               check_same_thread=False)
+
+    def seed(self, num_users: int, num_seats: int, num_trips: int = 1, segments: int = 1):
+        with self.pool.connection() as conn:
+            conn.executescript("""
+                DROP TABLE IF EXISTS seats;
+                DROP TABLE IF EXISTS trips;
+                DROP TABLE IF EXISTS users;
+                CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+                CREATE TABLE trips (id INTEGER PRIMARY KEY, name TEXT NOT NULL, segments INTEGER NOT NULL DEFAULT 1);
+                CREATE TABLE seats (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    trip_id INTEGER NOT NULL,
+                    segment INTEGER NOT NULL DEFAULT 0,
+                    user_id INTEGER NULL
+                );
+                CREATE INDEX idx_seats_segment ON seats (trip_id, segment);
+            """)
+            conn.execute("BEGIN")
+            conn.executemany("INSERT INTO trips (id, name, segments) VALUES (?, ?, ?)",
+                             [(i, trip_name(i), segments) for i in range(1, num_trips + 1)])
+            conn.executemany("INSERT INTO users (id, name) VALUES (?, ?)",
+                             [(i, f"User {i}") for i in range(1, num_users + 1)])
+            conn.executemany("INSERT INTO seats (id, name, trip_id, segment, user_id) VALUES (?, ?, ?, ?, NULL)",
+                             seat_rows(num_trips, num_seats, segments))
+            conn.execute("COMMIT")
+        self._segments = {}
+
+    def segments_of(self, trip_id: int) -> int:
+        segments = self._segments.get(trip_id)
+        if segments is None:
+            rows = self._query("SELECT segments FROM trips WHERE id = ?", (trip_id,))
+            segments = self._segments[trip_id] = rows[0][0] if rows else 1
+        return segments
+
+    def trip_ids(self) -> List[int]:
+        return [row[0] for row in self._query("SELECT id FROM trips ORDER BY id")]
+
+    def reset(self):
+        with self.pool.connection() as conn:
+            conn.execute("UPDATE seats SET user_id = NULL")
+
+    def get_all_users(self) -> List[User]:
+        return [User(*row) for row in self._query("SELECT id, name FROM users ORDER BY id")]
+
+    def allocations(self) -> List[Tuple[int, str, int]]:
+        return self._query("SELECT id, name, user_id FROM seats WHERE user_id IS NOT NULL ORDER BY id")
+
+    def free_seats(self) -> List[Seat]:
+        return [Seat(*row) for row in self._query(
+            "SELECT id, name, trip_id, user_id FROM seats WHERE user_id IS NULL ORDER BY trip_id, id")]
+
+    def assign_seats(self, assignments: List[Tuple[int, int]]) -> int:
+        with self.pool.connection() as conn, self.write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            written = 0
+            for seat_id, user_id in assignments:
+                written += conn.execute("UPDATE seats SET user_id = ? WHERE id = ? AND user_id IS NULL",
+                                        (user_id, seat_id)).rowcount
+            conn.execute("COMMIT")
+            return written
+
+    def book(self, user: User, strategy: str, trip_id: int = TRIP_ID) -> Booking:
+        # Before borrowing: on a cold cache segments_of() needs a connection of its own
+        segments = self.segments_of(trip_id)
+        with self.pool.connection() as conn:
+            return self._book(conn, user, strategy, trip_id, segments)
+
+    def _book(self, conn, user: User, strategy: str, trip_id: int, segments: int) -> Booking:
+        order = segment_order(user_segment(user.id, segments), segments)
+        if strategy == OPTIMISTIC:
+            return self._book_optimistic(conn, user, trip_id, order)
+        txn = _Transaction(conn, self.locks, self.write_lock)
+        try:
+            seat = txn.select_seat(trip_id, strategy, order)
+            if seat is None:
+                txn.rollback()
+                return Booking(None, "No available seats", txn.lock_wait, 1, txn.collisions, order[0])
+
+            txn.update(seat.id, user.id)
+            txn.commit()
+            return Booking(seat, None, txn.lock_wait, 1, txn.collisions, order[0])
+
+        except Exception as e:
+            txn.rollback()
+            return Booking(None, str(e), txn.lock_wait, 1, txn.collisions, order[0])
+
+    def _book_optimistic(self, conn, user: User, trip_id: int, segments: List[int]) -> Booking:
+        lock_wait = 0.0
+        collisions = 0
+        for attempt in range(MAX_ATTEMPTS):
+            txn = _Transaction(conn, self.locks, self.write_lock)
+            try:
+                rows = []
+                for segment in segments:
+                    rows = conn.execute("SELECT id, name, trip_id, user_id FROM seats "
+                                        "WHERE trip_id = ? AND segment = ? AND user_id IS NULL ORDER BY id LIMIT ?",
+                                        (trip_id, segment, CANDIDATES)).fetchall()
+                    if rows:
+                        break
+                if not rows:
+                    txn.rollback()
+                    return Booking(None, "No available seats", lock_wait, attempt + 1, collisions, segments[0])
+
+                seat = Seat(*pick_candidate(rows, user, attempt))
+                claimed = txn.update_if_free(seat.id, user.id)
+                txn.commit()
+            except Exception as e:
+                txn.rollback()
+                return Booking(None, str(e), lock_wait + txn.lock_wait, attempt + 1,
+                               collisions + txn.collisions, segments[0])
+            lock_wait += txn.lock_wait
+            collisions += txn.collisions
+            if claimed:
+                return Booking(seat, None, lock_wait, attempt + 1, collisions, segments[0])
+            backoff(attempt)
+
+        return Booking(None, f"Gave up after {MAX_ATTEMPTS} conflicting attempts", lock_wait,
+                       MAX_ATTEMPTS, collisions, segments[0])
+
+    def book_many(self, users: List[User], trip_id: int = TRIP_ID) -> GroupBooking:
+        segments = self.segments_of(trip_id)  # before borrowing, see book()
+        with self.pool.connection() as conn:
+            return self._book_many(conn, users, trip_id, segments)
+
+    def _book_many(self, conn, users: List[User], trip_id: int, segments: int) -> GroupBooking:
+        order = segment_order(user_segment(users[0].id, segments) if users else 0, segments)
+        txn = _Transaction(conn, self.locks, self.write_lock)
+        try:
+            seats = txn.select_seats(trip_id, SKIP_LOCKED, len(users), order)
+            if not seats:
+                txn.rollback()
+                return GroupBooking([None] * len(users), "No available seats", txn.lock_wait,
+                                    txn.collisions, order[0])
+
+            for user, seat in zip(users, seats):
+                txn.update(seat.id, user.id)
+            txn.commit()
+            return GroupBooking(seats + [None] * (len(users) - len(seats)), None, txn.lock_wait,
+                                txn.collisions, order[0])
+
+        except Exception as e:
+            txn.rollback()
+            return GroupBooking([None] * len(users), str(e), txn.lock_wait, txn.collisions, order[0])
+
+    def close(self):
+        self.pool.close_all()
+
+    def remove(self):
+        """Delete the database files, for throwaway benchmark runs"""
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def _query(self, sql: str, params=()) -> list:
+        with self.pool.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+
+BACKENDS = {
+    MySQLBackend.name: MySQLBackend,
+    EmbeddedBackend.name: EmbeddedBackend,
+}
@@ -0,0 +1,172 @@
+"""
+In-memory seat allocation with write-behind persistence.
+
+Every book() in booking.py contends on the same "first free seat ORDER BY id"
+rows in the database. SeatInventory instead hands seats out of a free list
+kept in process memory, split into lock stripes so concurrent users mostly
+take different locks. Assignments are written to the database in batches by a
+background thread. On startup the free lists are rebuilt from the database,
+which stays the source of truth.
+
+Trade-off: a seat is promised before it is written. If the process dies
+between the two, the unwritten assignments are lost and those seats are
+offered again after the rebuild. Only one process may allocate a trip's seats
+this way, since nothing but this process's memory stops two processes from
+promising the same seat.
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from booking import TRIP_ID, Booking, GroupBooking, Seat, User, user_segment
+
+STRIPES = 16  # free-list stripes per trip, each with its own lock
+FLUSH_INTERVAL = 0.05  # seconds the writer waits to fill a batch
+FLUSH_BATCH = 500  # assignments per database transaction
+
+
+class _Stripe:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seats: List[Seat] = []  # highest id first, so pop() hands out the lowest
+
+
+class SeatInventory:
+    """
+    Free seats of every trip, handed out from memory.
+
+    A user starts at the stripe its id hashes to, like a booking starts at its
+    segment, and moves on to the next stripe when that one is empty, so a trip
+    sells out completely whatever the starting stripe. Allocation holds a
+    stripe lock for one list pop. A stripe found locked counts as a collision.
+    """
+
+    def __init__(self, backend, stripes: int = STRIPES, flush_interval: float = FLUSH_INTERVAL,
+                 flush_batch: int = FLUSH_BATCH):
+        self.backend = backend
+        self.stripe_count = stripes
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.trips: Dict[int, List[_Stripe]] = {}
+        self.pending: "queue.Queue[Tuple[int, int]]" = queue.Queue()
+        self.persisted = 0
+        self.conflicts = 0  # assignments the database refused, the seat was taken elsewhere
+        self.closed = False
+        self.load()
+        self._writer = threading.Thread(target=self._flush_loop, daemon=True)
+        self._writer.start()
+
+    def load(self):
+        """Rebuild the free lists from the unassigned seats in the database"""
+        trips: Dict[int, List[_Stripe]] = {}
+        for seat in reversed(self.backend.free_seats()):
+            stripes = trips.get(seat.trip_id)
+            if stripes is None:
+                stripes = trips[seat.trip_id] = [_Stripe() for _ in range(self.stripe_count)]
+            stripes[seat.id % self.stripe_count].seats.append(seat)
+        self.trips = trips
+
+    def free(self, trip_id: int = TRIP_ID) -> int:
+        return sum(len(stripe.seats) for stripe in self.trips.get(trip_id, ()))
+
+    def _take(self, stripes: List[_Stripe], start: int, count: int) -> Tuple[List[Seat], float, int]:
+        """Up to `count` seats from stripe `start` onwards, with the lock wait and the stripes found locked"""
+        seats: List[Seat] = []
+        lock_wait = 0.0
+        collisions = 0
+        for i in range(len(stripes)):
+            stripe = stripes[(start + i) % len(stripes)]
+            if not stripe.seats:
+                continue
+            if not stripe.lock.acquire(blocking=False):
+                collisions += 1
+                started = time.perf_counter()
+                stripe.lock.acquire()
+                lock_wait += time.perf_counter() - started
+            try:
+                while stripe.seats and len(seats) < count:
+                    seats.append(stripe.seats.pop())
+            finally:
+                stripe.lock.release()
+            if len(seats) == count:
+                break
+        return seats, lock_wait, collisions
+
+    def allocate(self, user: User, trip_id: int = TRIP_ID) -> Booking:
+        """book() from memory. The seat is written to the database shortly after."""
+        if self.closed:
+            return Booking(None, "Inventory is closed", 0.0)
+        stripes = self.trips.get(trip_id)
+        if not stripes:
+            return Booking(None, "No available seats", 0.0)
+
+        start = user_segment(user.id, len(stripes))
+        seats, lock_wait, collisions = self._take(stripes, start, 1)
+        if not seats:
+            return Booking(None, "No available seats", lock_wait, 1, collisions, start)
+        seat = seats[0]
+        seat.user_id = user.id
+        self.pending.put((seat.id, user.id))
+        return Booking(seat, None, lock_wait, 1, collisions, start)
+
+    def allocate_many(self, users: List[User], trip_id: int = TRIP_ID) -> GroupBooking:
+        """book_many() from memory, a partial fill when fewer seats are left"""
+        if self.closed:
+            return GroupBooking([None] * len(users), "Inventory is closed", 0.0)
+        stripes = self.trips.get(trip_id)
+        if not stripes or not users:
+            return GroupBooking([None] * len(users), "No available seats", 0.0)
+
+        start = user_segment(users[0].id, len(stripes))
+        seats, lock_wait, collisions = self._take(stripes, start, len(users))
+        if not seats:
+            return GroupBooking([None] * len(users), "No available seats", lock_wait, collisions, start)
+        for user, seat in zip(users, seats):
+            seat.user_id = user.id
+            self.pending.put((seat.id, user.id))
+        return GroupBooking(seats + [None] * (len(users) - len(seats)), None, lock_wait, collisions, start)
+
+    def _flush_loop(self):
+        while not self.closed or not self.pending.empty():
+            try:
+                batch = [self.pending.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            # Whatever queued up meanwhile goes in the same transaction
+            while len(batch) < self.flush_batch:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            self._persist(batch)
+            for _ in batch:
+                self.pending.task_done()
+
+    def _persist(self, batch: List[Tuple[int, int]]):
+        while True:
+            try:
+                written = self.backend.assign_seats(batch)
+            except Exception as e:
+                if self.closed and self.pending.empty():
+                    logging.error(f"Giving up on {len(batch)} seat assignments: {e}")
+                    return
+                logging.warning(f"Could not persist {len(batch)} seat assignments, retrying: {e}")
+                time.sleep(self.flush_interval)
+                continue
+            self.persisted += written
+            if written < len(batch):
+                self.conflicts += len(batch) - written
+                logging.error(f"{len(batch) - written} assigned seats were already taken in the database")
+            return
+
+    def flush(self):
+        """Wait until every allocation so far has been written"""
+        self.pending.join()
+
+    def close(self):
+        """Stop allocating and write out what is still pending"""
+        self.closed = True
+        self._writer.join()
@@ -0,0 +1,56 @@
+import bisect
+import hashlib
+from functools import lru_cache
+from typing import Iterable, List
+
+
+class ConsistentHashRing:
+    """
+    Consistent hash ring with virtual nodes.
+
+    Every shard is placed on the ring `vnodes` times, a key belongs to the first
+    virtual node clockwise from its hash. Adding or removing a shard only moves
+    the keys between its virtual nodes and their neighbours, about 1/N of them.
+
+    Rings are immutable: `with_node` / `without_node` return a new ring, so a
+    router can swap the whole map in one assignment.
+    """
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = 160, cache_size: int = 65536):
+        self.nodes: List[str] = list(dict.fromkeys(nodes))
+        self.vnodes = vnodes
+        self.cache_size = cache_size
+
+        points = sorted(
+            (self.hash_key(f"{node}#{i}"), node)
+            for node in self.nodes
+            for i in range(vnodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+        # Hot users are looked up on every heartbeat, skip the bisect for them
+        self.get_node = lru_cache(maxsize=cache_size)(self._lookup)
+
+    @staticmethod
+    def hash_key(key: str) -> int:
+        """Stable across processes, unlike the salted built-in hash()"""
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def _lookup(self, key: str) -> str:
+        if not self._hashes:
+            raise LookupError("hash ring has no nodes")
+        index = bisect.bisect(self._hashes, self.hash_key(key))
+        return self._owners[index % len(self._owners)]
+
+    def with_node(self, node: str) -> "ConsistentHashRing":
+        return ConsistentHashRing(self.nodes + [node], self.vnodes, self.cache_size)
+
+    def without_node(self, node: str) -> "ConsistentHashRing":
+        return ConsistentHashRing([n for n in self.nodes if n != node], self.vnodes, self.cache_size)
+
+    def __contains__(self, node: str) -> bool:
+        return node in self.nodes
+
+    def __len__(self) -> int:
+        return len(self.nodes)
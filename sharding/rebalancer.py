@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Tuple
+
+from connection_pool import ShardConnectionPool
+from hash_ring import ConsistentHashRing
+
+
+class ShardRouter:
+    """
+    Current shard map plus an optional in-flight migration.
+
+    Both rings live in one tuple so readers always see a consistent pair and
+    cut-over is a single assignment. With a `path`, cut-over also writes the
+    new shard list there, so a restarted process routes to where the rows are.
+    """
+
+    def __init__(self, ring: ConsistentHashRing, path: Optional[str] = None):
+        self.state: Tuple[ConsistentHashRing, Optional[ConsistentHashRing]] = (ring, None)
+        self.path = path
+
+    @classmethod
+    def load(cls, path: str, default_nodes: List[str]) -> "ShardRouter":
+        """Router over the shard list saved at `path`, or `default_nodes` before the first rebalance"""
+        try:
+            with open(path) as f:
+                nodes = json.load(f)["shards"]
+        except FileNotFoundError:
+            nodes = default_nodes
+        return cls(ConsistentHashRing(nodes), path)
+
+    def save(self, ring: ConsistentHashRing):
+        """Write the ring's shard list, atomically so a crash never leaves half a file"""
+        if self.path is None:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"shards": ring.nodes}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    @property
+    def ring(self) -> ConsistentHashRing:
+        return self.state[0]
+
+    @property
+    def migrating(self) -> bool:
+        return self.state[1] is not None
+
+    def write_shard(self, user_id: str) -> str:
+        """New writes go straight to the new owner once a migration has started"""
+        current, target = self.state
+        return (target or current).get_node(user_id)
+
+    def read_shards(self, user_id: str) -> List[str]:
+        """New location first, old location too while the row may not be copied yet"""
+        current, target = self.state
+        old = current.get_node(user_id)
+        if target is None:
+            return [old]
+        new = target.get_node(user_id)
+        return [new] if new == old else [new, old]
+
+    def all_shards(self) -> List[str]:
+        current, target = self.state
+        return list(dict.fromkeys(current.nodes + (target.nodes if target else [])))
+
+    def begin(self, target: ConsistentHashRing):
+        if self.migrating:
+            raise RuntimeError("a rebalance is already in progress")
+        self.state = (self.state[0], target)
+
+    def cut_over(self):
+        # Saved first: cleanup deletes the old copies, after that only the new map finds the rows
+        target = self.state[1]
+        self.save(target)
+        self.state = (target, None)
+
+
+class Rebalancer:
+    """
+    Moves heartbeat rows to their new shard after the shard map changes.
+
+    Rows are copied in small batches with a pause in between so live heartbeat
+    traffic keeps its share of the disk. A copy never overwrites a newer
+    heartbeat that was written to the new shard during the move.
+
+    `write_lock` is held by whoever writes heartbeats (the write buffer's
+    flush). Switching the router under it means no write routed to an old
+    shard can commit after the copy has scanned past it, where cleanup
+    would delete it.
+    """
+
+    def __init__(self, router: ShardRouter, pools: Dict[str, ShardConnectionPool],
+                 batch_size: int = 500, pause: float = 0.05, write_lock: Optional[threading.Lock] = None):
+        self.router = router
+        self.pools = pools
+        self.write_lock = write_lock if write_lock is not None else nullcontext()
+        self.batch_size = batch_size
+        self.pause = pause
+        self.thread: Optional[threading.Thread] = None
+        self.progress = {"state": "idle", "scanned": 0, "moved": 0, "deleted": 0}
+
+    def start(self, target: ConsistentHashRing) -> threading.Thread:
+        with self.write_lock:
+            self.router.begin(target)
+        self.progress = {"state": "copying", "scanned": 0, "moved": 0, "deleted": 0}
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def _run(self):
+        old_ring, new_ring = self.router.state
+        try:
+            for db_name in old_ring.nodes:
+                self._copy_shard(db_name, new_ring)
+
+            # Every moved row now exists on its new shard, switch reads over
+            with self.write_lock:
+                self.router.cut_over()
+            self.progress["state"] = "cleaning"
+
+            for db_name in old_ring.nodes:
+                self._delete_moved(db_name, new_ring)
+            self.progress["state"] = "done"
+        except Exception as e:
+            self.progress["state"] = f"failed: {e}"
+            raise
+
+    def _scan(self, db_name: str):
+        """Yield batches of (rowid, user_id, last_heartbeat) in rowid order"""
+        last_rowid = 0
+        while True:
+            with self.pools[db_name].connection() as conn:
+                rows = conn.execute(
+                    'SELECT rowid, user_id, last_heartbeat FROM heartbeats WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                    (last_rowid, self.batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            last_rowid = rows[-1][0]
+            yield rows
+            time.sleep(self.pause)
+
+    def _copy_shard(self, db_name: str, new_ring: ConsistentHashRing):
+        for rows in self._scan(db_name):
+            self.progress["scanned"] += len(rows)
+            moves = {}
+            for _, user_id, last_heartbeat in rows:
+                owner = new_ring.get_node(user_id)
+                if owner != db_name:
+                    moves.setdefault(owner, []).append((user_id, last_heartbeat))
+
+            for owner, batch in moves.items():
+                with self.pools[owner].connection() as conn:
+                    conn.executemany('''
+                    INSERT INTO heartbeats (user_id, last_heartbeat) VALUES (?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET
+                        last_heartbeat = MAX(last_heartbeat, excluded.last_heartbeat)
+                    ''', batch)
+                    conn.commit()
+                self.progress["moved"] += len(batch)
+
+    def _delete_moved(self, db_name: str, new_ring: ConsistentHashRing):
+        for rows in self._scan(db_name):
+            stale = [(user_id,) for _, user_id, _ in rows if new_ring.get_node(user_id) != db_name]
+            if not stale:
+                continue
+            with self.pools[db_name].connection() as conn:
+                conn.executemany('DELETE FROM heartbeats WHERE user_id = ?', stale)
+                conn.commit()
+            self.progress["deleted"] += len(stale)
@@ -0,0 +1,160 @@
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from connection_pool import ShardConnectionPool
+
+Row = Tuple[int, str]  # (last_heartbeat, user_id), also the sort key
+Route = Callable[[str], List[str]]  # user_id -> shards that may hold its row, owner first
+
+IN_BATCH = 500  # user ids per IN (...) lookup, below SQLite's bound parameter limit
+
+
+class ScatterGather:
+    """
+    Runs the same query on every shard in parallel and merges the answers.
+
+    Lists are merged as streams: each shard yields rows already sorted by
+    (last_heartbeat, user_id), fetched a page at a time with a keyset cursor,
+    and heapq.merge pulls only as many rows as the caller consumes.
+
+    A rebalance leaves a moved user's row on two shards. Once cut over, only
+    the owner answers for it. Before that both copies are read and merged
+    into one, with the newer heartbeat: writes and copies only ever move the
+    owner's heartbeat forward, so its copy is never the older one.
+    """
+
+    def __init__(self, pools: Dict[str, ShardConnectionPool], route: Route, max_workers: int = 8,
+                 page_size: int = 200):
+        self.pools = pools
+        self.route = route
+        self.page_size = page_size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scatter")
+
+    def scatter(self, shards: List[str], fn, *args) -> Dict[str, object]:
+        """Call fn(db_name, *args) for every shard concurrently"""
+        futures = {db_name: self.executor.submit(fn, db_name, *args) for db_name in shards}
+        return {db_name: future.result() for db_name, future in futures.items()}
+
+    # --- one copy per user --------------------------------------------------
+
+    def _role(self, db_name: str, user_id: str) -> int:
+        """0: the user's only shard, 1: one of its two copies mid-copy, -1: a copy left for cleanup"""
+        shards = self.route(user_id)
+        if db_name not in shards:
+            return -1
+        return 0 if len(shards) == 1 else 1
+
+    def _newer_on_owner(self, rows: List[Row]) -> Set[str]:
+        """Users among `rows` whose owner already has a newer heartbeat than the row's"""
+        by_owner: Dict[str, Dict[str, int]] = {}
+        for last_heartbeat, user_id in rows:
+            by_owner.setdefault(self.route(user_id)[0], {})[user_id] = last_heartbeat
+
+        newer = set()
+        for owner, heartbeats in by_owner.items():
+            ids = list(heartbeats)
+            with self.pools[owner].connection() as conn:
+                for i in range(0, len(ids), IN_BATCH):
+                    batch = ids[i:i + IN_BATCH]
+                    placeholders = ", ".join("?" * len(batch))
+                    newer.update(user_id for user_id, last_heartbeat in conn.execute(
+                        f'SELECT user_id, last_heartbeat FROM heartbeats WHERE user_id IN ({placeholders})', batch
+                    ) if last_heartbeat > heartbeats[user_id])
+        return newer
+
+    # --- counts -----------------------------------------------------------
+
+    def _count_since(self, db_name: str, since: int) -> Tuple[int, List[str]]:
+        """Users only this shard holds, plus the ids of those being moved (counted once in count_active)"""
+        with self.pools[db_name].connection() as conn:
+            conn.create_function("shard_role", 1, lambda user_id: self._role(db_name, user_id))
+            settled = conn.execute(
+                'SELECT COUNT(*) FROM heartbeats WHERE last_heartbeat >= ? AND shard_role(user_id) = 0', (since,)
+            ).fetchone()[0]
+            moving = [row[0] for row in conn.execute(
+                'SELECT user_id FROM heartbeats WHERE last_heartbeat >= ? AND shard_role(user_id) = 1', (since,)
+            )]
+        return settled, moving
+
+    def _count_stored(self, db_name: str) -> int:
+        with self.pools[db_name].connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM heartbeats').fetchone()[0]
+
+    def count_active(self, shards: List[str], since: int) -> Dict[str, int]:
+        """Users with a heartbeat since `since`, each counted once, on its owner"""
+        per_shard = self.scatter(shards, self._count_since, since)
+        counts = {db_name: settled for db_name, (settled, _) in per_shard.items()}
+        # Either copy may be the one that is recent enough, the owner's never is older
+        for user_id in {user_id for _, moving in per_shard.values() for user_id in moving}:
+            counts[self.route(user_id)[0]] += 1
+        return counts
+
+    def count_rows(self, shards: List[str]) -> Dict[str, int]:
+        """Rows stored per shard, copies awaiting cleanup included"""
+        return self.scatter(shards, self._count_stored)
+
+    # --- sorted streams ---------------------------------------------------
+
+    def _page(self, db_name: str, where: str, params: tuple, after: Optional[Row], descending: bool) -> List[Row]:
+        order = "DESC" if descending else "ASC"
+        sql = f'SELECT last_heartbeat, user_id FROM heartbeats WHERE {where}'
+        if after is not None:
+            sql += f' AND (last_heartbeat, user_id) {"<" if descending else ">"} (?, ?)'
+            params = params + after
+        sql += f' ORDER BY last_heartbeat {order}, user_id {order} LIMIT ?'
+        with self.pools[db_name].connection() as conn:
+            return conn.execute(sql, params + (self.page_size,)).fetchall()
+
+    def _answering(self, db_name: str, page: List[Row]) -> List[Row]:
+        """Drops copies left for cleanup, and moving users' rows that the owner has superseded"""
+        roles = [self._role(db_name, user_id) for _, user_id in page]
+        moving = [row for row, role in zip(page, roles) if role == 1]
+        newer = self._newer_on_owner(moving) if moving else set()
+        return [row for row, role in zip(page, roles) if role == 0 or (role == 1 and row[1] not in newer)]
+
+    def _shard_stream(self, db_name: str, first_page: List[Row], where: str, params: tuple,
+                      descending: bool) -> Iterator[Row]:
+        page = first_page
+        while page:
+            yield from self._answering(db_name, page)
+            if len(page) < self.page_size:
+                return
+            page = self._page(db_name, where, params, page[-1], descending)
+
+    def merged(self, shards: List[str], where: str, params: tuple = (),
+               after: Optional[Row] = None, descending: bool = False) -> Iterator[Row]:
+        """All matching rows across shards, globally sorted, fetched lazily"""
+        # First page of every shard in parallel, later pages only if the merge needs them
+        first_pages = self.scatter(shards, self._page, where, params, after, descending)
+        streams = [
+            self._shard_stream(db_name, first_pages[db_name], where, params, descending)
+            for db_name in shards
+        ]
+        return self._once_per_user(heapq.merge(*streams, reverse=descending))
+
+    def _once_per_user(self, rows: Iterator[Row]) -> Iterator[Row]:
+        """A user copied with the same heartbeat comes out of both shards, keep the first"""
+        seen = set()
+        for row in rows:
+            if len(self.route(row[1])) > 1:
+                if row[1] in seen:
+                    continue
+                seen.add(row[1])
+            yield row
+
+    def top_k(self, shards: List[str], k: int) -> List[Row]:
+        """Most recent heartbeats across all shards"""
+        return list(islice(self.merged(shards, "1 = 1", descending=True), k))
+
+    def page(self, shards: List[str], where: str, params: tuple, limit: int,
+             after: Optional[Row] = None) -> Tuple[List[Row], Optional[Row]]:
+        """One page of a sorted listing plus the cursor for the next one"""
+        rows = list(islice(self.merged(shards, where, params, after), limit + 1))
+        if len(rows) > limit:
+            return rows[:limit], rows[limit - 1]
+        return rows, None
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,162 @@
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class SpaceSaving:
+    """
+    Top-K heavy hitters in O(k) memory (Metwally et al.).
+
+    Tracks at most `k` keys. A new key evicts the smallest counter and
+    inherits its count, so counts are over-estimates by at most `error`.
+    """
+
+    def __init__(self, k: int = 20):
+        self.k = k
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, key: str):
+        if key in self.counts:
+            self.counts[key] += 1
+        elif len(self.counts) < self.k:
+            self.counts[key] = 1
+            self.errors[key] = 0
+        else:
+            victim = min(self.counts, key=self.counts.get)
+            floor = self.counts.pop(victim)
+            self.errors.pop(victim)
+            self.counts[key] = floor + 1
+            self.errors[key] = floor
+
+    def top(self, n: Optional[int] = None) -> List[dict]:
+        ranked = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:n or self.k]
+        return [{"user_id": key, "count": count, "error": self.errors[key]} for key, count in ranked]
+
+
+class LatencyHistogram:
+    """Fixed buckets in milliseconds, cheap to update and to merge"""
+
+    BOUNDS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.BOUNDS_MS) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.total_ms = 0.0
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        self.buckets[bisect.bisect_left(self.BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Upper bound of the bucket holding the pct-th observation"""
+        if not self.count:
+            return None
+        rank = pct / 100 * self.count
+        seen = 0
+        for bound, bucket in zip(self.BOUNDS_MS + [float("inf")], self.buckets):
+            seen += bucket
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        labels = [f"le_{bound}" for bound in self.BOUNDS_MS] + ["le_inf"]
+        return {
+            "buckets": dict(zip(labels, self.buckets)),
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else None,
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+        }
+
+
+class RateCounter:
+    """Requests per second over a sliding window of one-second slots"""
+
+    def __init__(self, window: int = 60):
+        self.window = window
+        self.slots = [0] * window
+        self.slot_times = [0] * window
+
+    def add(self, now: float):
+        second = int(now)
+        index = second % self.window
+        if self.slot_times[index] != second:
+            self.slot_times[index] = second
+            self.slots[index] = 0
+        self.slots[index] += 1
+
+    def rate(self, now: float) -> float:
+        oldest = int(now) - self.window
+        return sum(count for count, second in zip(self.slots, self.slot_times) if second > oldest) / self.window
+
+
+class ShardMetrics:
+    def __init__(self, top_k: int = 20):
+        self.requests = {"read": 0, "write": 0}
+        self.rate = RateCounter()
+        self.latency = {"read": LatencyHistogram(), "write": LatencyHistogram(), "flush": LatencyHistogram()}
+        self.hot_users = SpaceSaving(top_k)
+        self.rows_flushed = 0
+
+
+class MetricsRegistry:
+    """
+    Per-shard request rate, latency histograms and hottest users.
+
+    Memory is fixed per shard (buckets, 60 rate slots, top_k counters) no
+    matter how many users or requests go through.
+    """
+
+    def __init__(self, top_k: int = 20):
+        self.top_k = top_k
+        self.shards: Dict[str, ShardMetrics] = {}
+        self.lock = threading.Lock()  # the write buffer flushes on its own thread
+
+    def _shard(self, db_name: str) -> ShardMetrics:
+        if db_name not in self.shards:
+            self.shards[db_name] = ShardMetrics(self.top_k)
+        return self.shards[db_name]
+
+    def record(self, db_name: str, op: str, user_id: str, seconds: float):
+        now = time.time()
+        with self.lock:
+            shard = self._shard(db_name)
+            shard.requests[op] += 1
+            shard.rate.add(now)
+            shard.latency[op].observe(seconds)
+            shard.hot_users.add(user_id)
+
+    def record_flush(self, db_name: str, rows: int, seconds: float):
+        with self.lock:
+            shard = self._shard(db_name)
+            shard.latency["flush"].observe(seconds)
+            shard.rows_flushed += rows
+
+    def snapshot(self, row_counts: Dict[str, int]) -> dict:
+        now = time.time()
+        with self.lock:
+            shards = {}
+            for db_name in dict.fromkeys(list(row_counts) + list(self.shards)):
+                shard = self._shard(db_name)
+                shards[db_name] = {
+                    "requests": dict(shard.requests),
+                    "requests_per_sec": shard.rate.rate(now),
+                    "rows": row_counts.get(db_name),
+                    "rows_flushed": shard.rows_flushed,
+                    "latency": {op: histogram.snapshot() for op, histogram in shard.latency.items()},
+                    "hot_users": shard.hot_users.top(10),
+                }
+
+        # Share of traffic per shard, 1.0 everywhere means perfectly even
+        totals = {db_name: sum(data["requests"].values()) for db_name, data in shards.items()}
+        mean = sum(totals.values()) / len(totals) if totals else 0
+        for db_name, data in shards.items():
+            data["load_vs_mean"] = totals[db_name] / mean if mean else None
+        skew = max(totals.values()) / mean if mean else None
+
+        return {"shards": shards, "skew": skew}
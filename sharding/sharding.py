@@ -1,30 +1,64 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-import sqlite3
+from typing import Optional
+import asyncio
 import time
 import uvicorn
 
+from connection_pool import ShardConnectionPool
+from rebalancer import Rebalancer, ShardRouter
+from scatter_gather import ScatterGather
+from shard_metrics import MetricsRegistry
+from write_buffer import HeartbeatWriteBuffer
 
 app = FastAPI()
 
-DB_NAMES = ["sharding.db", "sharding2.db"]
-    
+DB_NAMES = ["sharding.db", "sharding2.db"]  # shard map until the first rebalance saves SHARD_MAP_PATH
+SHARD_MAP_PATH = "shards.json"  # current shard list, rewritten at every rebalance cut-over
+
+POOL_SIZE = 5  # long-lived connections per shard
+
+ACTIVE_WINDOW = 30  # seconds since last heartbeat to count as "active"
+
+FLUSH_INTERVAL_MS = 200  # heartbeats are coalesced and written once per interval
+MAX_PENDING_HEARTBEATS = 100_000  # buffered users before a writer flushes inline
+
+HOT_USERS_TRACKED = 20  # space-saving counters per shard
+
+REBALANCE_BATCH_SIZE = 500  # rows copied per batch
+REBALANCE_PAUSE = 0.05  # seconds between batches, keeps live traffic responsive
+
 class HeartBeatRequest(BaseModel):
     user_id: str
 
+class ShardRequest(BaseModel):
+    db_name: str
 
-def get_shard_index(request: HeartBeatRequest) -> int:
-    user_id = request.user_id
-    if user_id == "1":
-        return 0
-    elif user_id == "2":
-        return 1;
-    else:
-        return 0
 
-def init_db():
-    for db_name in DB_NAMES:
-        conn = sqlite3.connect(db_name)
+# db_name -> pool, filled by init_db at startup and reused by every handler
+pools = {}
+
+router = ShardRouter.load(SHARD_MAP_PATH, DB_NAMES)
+cross_shard = ScatterGather(pools, router.read_shards)
+metrics = MetricsRegistry(top_k=HOT_USERS_TRACKED)
+write_buffer = HeartbeatWriteBuffer(
+    lambda user_id: router.write_shard(user_id), pools,
+    flush_interval=FLUSH_INTERVAL_MS / 1000, max_pending=MAX_PENDING_HEARTBEATS,
+    on_flush=metrics.record_flush,
+)
+# Flushes and router switches exclude each other, see Rebalancer
+rebalancer = Rebalancer(router, pools, batch_size=REBALANCE_BATCH_SIZE, pause=REBALANCE_PAUSE,
+                        write_lock=write_buffer.flush_lock)
+
+
+def get_shard(user_id: str) -> str:
+    """Database file that owns this user (the new owner while a rebalance runs)"""
+    return router.write_shard(user_id)
+
+def init_shard(db_name: str):
+    pool = ShardConnectionPool(db_name, POOL_SIZE)
+
+    with pool.connection() as conn:
         cursor = conn.cursor()
 
         cursor.execute('''
@@ -34,46 +68,138 @@ def init_db():
         )
         ''')
 
+        # Cross-shard listings walk this index in (last_heartbeat, user_id) order
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_heartbeats_last_heartbeat
+        ON heartbeats (last_heartbeat, user_id)
+        ''')
+
         conn.commit()
-        conn.close()
+
+    pools[db_name] = pool
+
+def init_db():
+    for db_name in router.ring.nodes:
+        init_shard(db_name)
+
+@app.on_event("shutdown")
+def flush_heartbeats():
+    write_buffer.close()
 
 @app.post("/heartbeat")
 async def post_heartbeat(request: HeartBeatRequest):
-    shard_index = get_shard_index(request.user_id)
-    db_name = DB_NAMES[shard_index]
-
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
+    started = time.perf_counter()
 
-    cursor.execute('''
-    REPLACE INTO heartbeats (user_id, last_heartbeat) VALUES (?, ?)
-    ''', (request.user_id, int(time.time())))
+    # Buffered, the flusher writes it to get_shard(user_id) within FLUSH_INTERVAL_MS
+    if write_buffer.record(request.user_id, int(time.time())):
+        # Buffer full: this writer waits for a flush, in a thread so other requests keep going
+        await asyncio.to_thread(write_buffer.flush)
 
-    conn.commit()
-    conn.close()
+    metrics.record(get_shard(request.user_id), "write", request.user_id, time.perf_counter() - started)
 
     return {"message": "Heartbeat recorded successfully"}
 
 @app.get("/heartbeat/status/{user_id}")
 async def get_heartbeat_status(user_id: str):
-    shard_index = get_shard_index(user_id)
-    db_name = DB_NAMES[shard_index]
+    started = time.perf_counter()
 
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
+    # A buffered heartbeat is always the newest one
+    pending = write_buffer.get(user_id)
+    if pending is not None:
+        metrics.record(get_shard(user_id), "read", user_id, time.perf_counter() - started)
+        return {"status": "active", "last_heartbeat": pending}
 
-    cursor.execute(''' SELECT last_heartbeat FROM heartbeats WHERE user_id = ?
-    ''', (user_id,))
+    # During a rebalance the row may still be on the old shard, read both
+    shards = router.read_shards(user_id)
+    result = None
+    served_by = shards[0]
+    for db_name in shards:
+        with pools[db_name].connection() as conn:
+            cursor = conn.cursor()
 
-    result = cursor.fetchone()
-    conn.close()
+            cursor.execute(''' SELECT last_heartbeat FROM heartbeats WHERE user_id = ?
+            ''', (user_id,))
+
+            row = cursor.fetchone()
+        if row and (result is None or row[0] > result[0]):
+            result = row
+            served_by = db_name
+
+    # One read per request, against the shard whose row answered it
+    metrics.record(served_by, "read", user_id, time.perf_counter() - started)
 
     if result:
         return {"status": "active", "last_heartbeat": result[0]}
     else:
         return {"status": "inactive", "last_heartbeat": None}
+
+# Changing the shard map starts a background migration, traffic keeps flowing
+@app.post("/admin/shards")
+async def add_shard(request: ShardRequest):
+    if request.db_name in router.all_shards():
+        raise HTTPException(status_code=409, detail=f"{request.db_name} is already a shard")
+    if router.migrating:
+        raise HTTPException(status_code=409, detail="A rebalance is already in progress")
+    init_shard(request.db_name)  # also opens its pool
+    # Waits for a running flush to finish, keep that off the event loop
+    await asyncio.to_thread(rebalancer.start, router.ring.with_node(request.db_name))
+    return {"message": f"Rebalancing onto {request.db_name}", "shards": router.all_shards()}
+
+@app.delete("/admin/shards/{db_name}")
+async def remove_shard(db_name: str):
+    if db_name not in router.ring:
+        raise HTTPException(status_code=404, detail=f"{db_name} is not a shard")
+    if len(router.ring) == 1:
+        raise HTTPException(status_code=400, detail="Cannot remove the last shard")
+    if router.migrating:
+        raise HTTPException(status_code=409, detail="A rebalance is already in progress")
+    await asyncio.to_thread(rebalancer.start, router.ring.without_node(db_name))
+    return {"message": f"Draining {db_name}", "shards": router.all_shards()}
+
+@app.get("/admin/rebalance")
+async def rebalance_status():
+    return {**rebalancer.progress, "migrating": router.migrating, "shards": router.ring.nodes}
+
+@app.get("/metrics")
+def shard_metrics():
+    """Per-shard load: request rate, latency histograms, row count and hottest users"""
+    return metrics.snapshot(cross_shard.count_rows(router.all_shards()))
+
+# Cross-shard queries: same query on every shard in parallel, results merged.
+# Plain def: they block on the shards, FastAPI runs them in its threadpool
+# so heartbeats keep being served on the event loop meanwhile.
+@app.get("/heartbeat/active/count")
+def count_active_users(window: int = ACTIVE_WINDOW):
+    per_shard = cross_shard.count_active(router.all_shards(), int(time.time()) - window)
+    return {"active": sum(per_shard.values()), "per_shard": per_shard}
+
+@app.get("/heartbeat/top")
+def most_recent_heartbeats(k: int = 10):
+    rows = cross_shard.top_k(router.all_shards(), max(1, min(k, 1000)))
+    return {"users": [{"user_id": user_id, "last_heartbeat": last_heartbeat} for last_heartbeat, user_id in rows]}
+
+@app.get("/heartbeat/stale")
+def list_stale_users(window: int = ACTIVE_WINDOW, limit: int = 100, cursor: Optional[str] = None):
+    """Users whose last heartbeat is older than the window, oldest first, keyset paginated"""
+    after = None
+    if cursor:
+        try:
+            last_heartbeat, user_id = cursor.split(":", 1)
+            after = (int(last_heartbeat), user_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="invalid cursor")
+
+    rows, next_row = cross_shard.page(
+        router.all_shards(), "last_heartbeat < ?", (int(time.time()) - window,),
+        max(1, min(limit, 1000)), after,
+    )
+    return {
+        "users": [{"user_id": user_id, "last_heartbeat": last_heartbeat} for last_heartbeat, user_id in rows],
+        "next_cursor": f"{next_row[0]}:{next_row[1]}" if next_row else None,
+    }
     
 
 if __name__ == "__main__":
     init_db()
+    write_buffer.start()
     uvicorn.run(app, host="0.0.0.0", port=9000)
@@ -0,0 +1,118 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from connection_pool import ShardConnectionPool
+
+
+class HeartbeatWriteBuffer:
+    """
+    Coalesces heartbeats in memory and writes them in batches.
+
+    Only the latest timestamp per user is kept, so a user beating every second
+    costs one row write per flush instead of one per request. A background
+    thread flushes every shard with one executemany transaction every
+    `flush_interval` seconds. When `max_pending` users are waiting, record()
+    says so and the caller runs flush() itself (off the event loop), which
+    bounds memory and pushes back on the writers.
+
+    A rebalance moves rows the flush may be writing. The rebalancer takes
+    `flush_lock` while it switches the router, so a batch is routed and
+    committed entirely under one shard map.
+    """
+
+    def __init__(self, route: Callable[[str], str], pools: Dict[str, ShardConnectionPool],
+                 flush_interval: float = 0.2, max_pending: int = 100_000,
+                 on_flush: Optional[Callable[[str, int, float], None]] = None):
+        self.route = route
+        self.pools = pools
+        self.on_flush = on_flush  # (db_name, rows, seconds) after each shard write
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self.pending: Dict[str, int] = {}
+        self.inflight: Dict[str, int] = {}  # taken by the running flush, until its shard commits
+        self.lock = threading.Lock()  # guards pending and inflight
+        self.flush_lock = threading.Lock()  # one flush at a time
+        self.stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.stats = {"heartbeats": 0, "rows_written": 0, "flushes": 0}
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def record(self, user_id: str, last_heartbeat: int) -> bool:
+        """Buffer a heartbeat. True when the buffer is full and the caller should flush()."""
+        with self.lock:
+            if last_heartbeat > self.pending.get(user_id, 0):
+                self.pending[user_id] = last_heartbeat
+            self.stats["heartbeats"] += 1
+            return len(self.pending) >= self.max_pending
+
+    def get(self, user_id: str) -> Optional[int]:
+        """Heartbeat not yet on disk, so reads see their own writes"""
+        with self.lock:
+            pending = self.pending.get(user_id)
+            inflight = self.inflight.get(user_id)
+        if pending is None or inflight is None:
+            return pending if inflight is None else inflight
+        return max(pending, inflight)
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, {}
+                self.inflight = dict(batch)
+            if not batch:
+                return
+
+            # Route at flush time so a rebalance that started meanwhile is respected
+            by_shard: Dict[str, List[Tuple[str, int]]] = {}
+            for user_id, last_heartbeat in batch.items():
+                by_shard.setdefault(self.route(user_id), []).append((user_id, last_heartbeat))
+
+            for db_name, rows in by_shard.items():
+                started = time.perf_counter()
+                try:
+                    with self.pools[db_name].connection() as conn:
+                        conn.executemany('''
+                        INSERT INTO heartbeats (user_id, last_heartbeat) VALUES (?, ?)
+                        ON CONFLICT(user_id) DO UPDATE SET
+                            last_heartbeat = MAX(last_heartbeat, excluded.last_heartbeat)
+                        ''', rows)
+                        conn.commit()
+                except Exception:
+                    logging.exception(f"Flushing {len(rows)} heartbeats to {db_name} failed, will retry")
+                    self._requeue(rows)
+                    continue
+                self._landed(rows)
+                self.stats["rows_written"] += len(rows)
+                if self.on_flush is not None:
+                    self.on_flush(db_name, len(rows), time.perf_counter() - started)
+            self.stats["flushes"] += 1
+
+    def _landed(self, rows: List[Tuple[str, int]]):
+        """Committed, the shard now answers for these rows"""
+        with self.lock:
+            for user_id, _ in rows:
+                self.inflight.pop(user_id, None)
+
+    def _requeue(self, rows: List[Tuple[str, int]]):
+        with self.lock:
+            for user_id, last_heartbeat in rows:
+                if last_heartbeat > self.pending.get(user_id, 0):
+                    self.pending[user_id] = last_heartbeat
+                self.inflight.pop(user_id, None)
+
+    def _run(self):
+        while not self.stopping.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Stop the flusher and write everything still buffered"""
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()